@@ -1,3 +1,17 @@
-from .handlers import register_handlers
+from .handlers import (
+    register_handlers,
+    poll_scheduler,
+    user_change_listener,
+    playback_states,
+)
+from .outbox import telegram_outbox
+from .sharding import shard_coordinator
 
-__all__ = ["register_handlers"]
+__all__ = [
+    "register_handlers",
+    "poll_scheduler",
+    "user_change_listener",
+    "playback_states",
+    "telegram_outbox",
+    "shard_coordinator",
+]
@@ -1,26 +1,49 @@
 from aiogram import types, F
-from aiogram.filters import Command
-from aiogram.types import Message, FSInputFile, ReplyKeyboardMarkup, KeyboardButton
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
+from aiogram.types import (
+    Message,
+    BufferedInputFile,
+    ReplyKeyboardMarkup,
+    KeyboardButton,
+)
 from aiogram.fsm.context import FSMContext
-from typing import Dict
+from typing import Dict, List, Optional, Sequence, Set
 import asyncio
-import os
-
+import functools
+import time
+
+from app.bot.playback import PlaybackStates
+from app.bot.outbox import Priority, telegram_outbox
+from app.bot.poll_policy import AdaptivePollPolicy
+from app.bot.rendering import PARSE_MODE, RenderedTrack, track_renderer
+from app.bot.scheduler import PollScheduler
+from app.bot.sharding import shard_coordinator
 from app.bot.states import ChannelState
-from app.bot.utils import url_encode
 from app.config import get_settings
 from app.logger import logger
 from app.database.repository import UserRepository
 from app.database.connection import get_session
-from app.services.spotify import SpotifyService
+from app.database.cache import user_config_cache, invalidate_user
+from app.database.notifications import UserChangeListener
+from app.database.write_behind import user_write_behind
+from app.services.cover_cache import cover_cache
+from app.services.spotify import spotify_service
+from app.services.track import Track
 from app.bot.messages import MESSAGES
 
 settings = get_settings()
-spotify_service = SpotifyService()
 
-active_update_tasks: Dict[int, asyncio.Task] = {}
+poll_scheduler = PollScheduler()
+poll_policy = AdaptivePollPolicy()
+user_change_listener = UserChangeListener()
 telegram_bot = None
-previous_tracks: Dict[int, dict] = {}
+playback_states = PlaybackStates()
+background_tasks: Set[asyncio.Task] = set()
+# Cover URL -> file_id of a photo upload in progress, awaited by other channels
+pending_photo_uploads: Dict[str, asyncio.Future] = {}
+# Users moved here from another worker, waiting for its last checkpoint
+handover_user_ids: Set[int] = set()
 
 
 def get_main_keyboard() -> ReplyKeyboardMarkup:
@@ -39,26 +62,123 @@ def get_main_keyboard() -> ReplyKeyboardMarkup:
     return keyboard
 
 
+def schedule_channel_updates(user_id: int) -> None:
+    """Poll user right away at the fast interval, e.g. after a settings change"""
+    if not shard_coordinator.owns(user_id) or user_id in handover_user_ids:
+        # The owning worker picks the change up from the user change listener;
+        # users being taken over are scheduled once the handover completes
+        return
+    state = playback_states.get(user_id)
+    state.idle_streak = 0
+    state.error_count = 0
+    poll_scheduler.add(user_id, delay=0)
+
+
+def stop_channel_updates(user_id: int) -> None:
+    poll_scheduler.remove(user_id)
+    playback_states.evict(user_id)
+
+
+async def rebalance_channel_updates() -> None:
+    """Schedule users this worker owns and drop the ones it no longer owns"""
+    telegram_outbox.set_worker_count(len(shard_coordinator.workers))
+
+    gained = []
+    released = []
+    for user in user_config_cache.values():
+        user_id = user.telegram_id
+        owned = shard_coordinator.owns(user_id)
+        if owned and user.updates_enabled and user.channel_ids:
+            if user_id not in poll_scheduler and user_id not in handover_user_ids:
+                gained.append(user_id)
+        elif user_id in poll_scheduler:
+            poll_scheduler.remove(user_id)
+            released.append(user_id)
+    if released:
+        # Checkpointed so their new owner resumes from what the channel shows
+        await playback_states.release(released)
+
+    if not gained:
+        return
+    if not shard_coordinator.enabled:
+        # No other worker could have polled them since load()
+        poll_scheduler.add_ramped(
+            (user_id, playback_states.resume_delay(user_id)) for user_id in gained
+        )
+        return
+    handover_user_ids.update(gained)
+    task = asyncio.create_task(take_over_users(gained))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+async def take_over_users(user_ids: List[int]) -> None:
+    """Start polling users moved here from another worker"""
+    try:
+        # The previous owner may poll them until its next heartbeat and
+        # checkpoints them when it lets go; resume from what it saved
+        await asyncio.sleep(2 * shard_coordinator.heartbeat_interval)
+        try:
+            await playback_states.reload(user_ids)
+        except Exception as e:
+            logger.error("Error reloading playback state of moved users: %s", e)
+    finally:
+        handover_user_ids.difference_update(user_ids)
+    poll_scheduler.add_ramped(
+        (user_id, playback_states.resume_delay(user_id))
+        for user_id in user_ids
+        if shard_coordinator.owns(user_id) and user_id not in poll_scheduler
+    )
+
+
+async def reconcile_user(user_id: int) -> None:
+    user = await user_config_cache.get(user_id)
+    if (
+        user
+        and user.updates_enabled
+        and user.channel_ids
+        and user_id not in poll_scheduler
+        and user_id not in handover_user_ids
+    ):
+        schedule_channel_updates(user_id)
+
+
+def handle_user_changed(user_id: int) -> None:
+    """Refresh a user changed by another process (web app or bot worker)"""
+    user_config_cache.invalidate(user_id)
+    task = asyncio.create_task(reconcile_user(user_id))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+async def resync_users() -> None:
+    """Reload every cached user after change notifications may have been lost"""
+    await user_config_cache.warm()
+    await rebalance_channel_updates()
+
+
 async def register_handlers(dp, bot):
     """Register all handlers"""
     global telegram_bot
     telegram_bot = bot
 
-    async for session in get_session():
-        user_repo = UserRepository(session)
-        users = await user_repo.get_all_users()
-        for user in users:
-            if user.updates_enabled and user.channel_id:
-                task = asyncio.create_task(
-                    update_channel_with_spotify_info(user.telegram_id)
-                )
-                active_update_tasks[user.telegram_id] = task
+    await user_config_cache.warm()
+    await playback_states.load()
+    await playback_states.start()
+    await user_write_behind.start()
+    await user_change_listener.start(handle_user_changed, resync_users)
+    await shard_coordinator.start(rebalance_channel_updates)
+    await rebalance_channel_updates()
+
+    await telegram_outbox.start()
+    await poll_scheduler.start(update_channel_with_spotify_info)
 
     dp.message.register(handle_start_command, Command("start"))
     dp.message.register(handle_toggle_command, Command("toggle"))
     dp.message.register(handle_setchannel_command, Command("setchannel"))
     dp.message.register(handle_list_users_command, Command("listusers"))
     dp.message.register(handle_mychannel_command, Command("mychannel"))
+    dp.message.register(handle_removechannel_command, Command("removechannel"))
 
     dp.message.register(handle_toggle_command, F.text == "🛑 Toggle Updates")
     dp.message.register(handle_setchannel_command, F.text == "🎯 Set Channel")
@@ -77,12 +197,15 @@ async def register_handlers(dp, bot):
 
 
 async def handle_start_command(message: Message) -> None:
-    logger.info(f"Start command received from user {message.from_user.id}")
+    logger.info("Start command received from user %s", message.from_user.id)
 
     async for session in get_session():
         user_repo = UserRepository(session)
         user = await user_repo.get_user_by_telegram_id(message.from_user.id)
 
+    if user:
+        user_write_behind.touch(message.from_user.id)
+
     if not user or not user.spotify_refresh_token:
         auth_url = spotify_service.get_auth_url(str(message.from_user.id))
         await message.answer(
@@ -96,18 +219,15 @@ async def handle_start_command(message: Message) -> None:
     elif not user.channel_id:
         await message.answer(MESSAGES["set_channel"], reply_markup=get_main_keyboard())
     else:
-        if user.updates_enabled and message.from_user.id not in active_update_tasks:
-            task = asyncio.create_task(
-                update_channel_with_spotify_info(message.from_user.id)
-            )
-            active_update_tasks[message.from_user.id] = task
+        if user.updates_enabled and message.from_user.id not in poll_scheduler:
+            schedule_channel_updates(message.from_user.id)
         await message.answer(
             MESSAGES["bot_configured"], reply_markup=get_main_keyboard()
         )
 
 
 async def handle_toggle_command(message: Message) -> None:
-    logger.info(f"Toggle command received from user {message.from_user.id}")
+    logger.info("Toggle command received from user %s", message.from_user.id)
 
     async for session in get_session():
         user_repo = UserRepository(session)
@@ -119,19 +239,12 @@ async def handle_toggle_command(message: Message) -> None:
 
         is_active = await user_repo.toggle_updates(message.from_user.id)
 
+    await invalidate_user(message.from_user.id)
     if is_active:
-        if message.from_user.id in active_update_tasks:
-            active_update_tasks[message.from_user.id].cancel()
-
-        task = asyncio.create_task(
-            update_channel_with_spotify_info(message.from_user.id)
-        )
-        active_update_tasks[message.from_user.id] = task
+        schedule_channel_updates(message.from_user.id)
         await message.answer(MESSAGES["updates_enabled"])
     else:
-        if message.from_user.id in active_update_tasks:
-            active_update_tasks[message.from_user.id].cancel()
-            del active_update_tasks[message.from_user.id]
+        stop_channel_updates(message.from_user.id)
         await message.answer(MESSAGES["updates_disabled"])
 
 
@@ -157,21 +270,16 @@ async def process_channel_id(message: Message, state: FSMContext):
 
         async for session in get_session():
             user_repo = UserRepository(session)
-            success = await user_repo.save_channel_id(message.from_user.id, channel_id)
+            success = await user_repo.add_channel(message.from_user.id, channel_id)
 
         if success:
+            await invalidate_user(message.from_user.id)
             async for session in get_session():
                 user_repo = UserRepository(session)
                 user = await user_repo.get_user_by_telegram_id(message.from_user.id)
 
             if user.updates_enabled:
-                if message.from_user.id in active_update_tasks:
-                    active_update_tasks[message.from_user.id].cancel()
-
-                task = asyncio.create_task(
-                    update_channel_with_spotify_info(message.from_user.id)
-                )
-                active_update_tasks[message.from_user.id] = task
+                schedule_channel_updates(message.from_user.id)
 
             await message.answer(
                 MESSAGES["channel_configured"].format(channel_title=chat.title)
@@ -179,7 +287,7 @@ async def process_channel_id(message: Message, state: FSMContext):
         else:
             await message.answer(MESSAGES["spotify_login_first"])
     except Exception as e:
-        logger.error(f"Error setting channel: {str(e)}")
+        logger.error("Error setting channel: %s", e)
         await message.answer(MESSAGES["channel_config_error"])
 
     await state.clear()
@@ -193,6 +301,7 @@ async def handle_list_users_command(message: Message) -> None:
     async for session in get_session():
         user_repo = UserRepository(session)
         users = await user_repo.get_all_users()
+        channel_ids = await user_repo.get_all_channel_ids()
 
     if not users:
         await message.answer(MESSAGES["no_users_found"])
@@ -208,7 +317,7 @@ async def handle_list_users_command(message: Message) -> None:
         response += MESSAGES["user_entry_template"].format(
             user_id=user.telegram_id,
             token_display=token_display,
-            channel_id=user.channel_id,
+            channel_ids=", ".join(channel_ids.get(user.telegram_id, ())) or "Not set",
             updates_enabled=user.updates_enabled,
         )
 
@@ -221,111 +330,238 @@ async def handle_list_users_command(message: Message) -> None:
 
 async def remove_channel_photo_update_message(message: types.Message):
     try:
-        await message.delete()
+        await telegram_outbox.submit(
+            message.chat.id, Priority.CLEANUP, message.delete
+        )
     except Exception as e:
-        logger.error(f"Error removing channel photo update message: {e}")
+        logger.error("Error removing channel photo update message: %s", e)
 
 
 async def remove_channel_title_update_message(message: types.Message):
     try:
-        await message.delete()
+        await telegram_outbox.submit(
+            message.chat.id, Priority.CLEANUP, message.delete
+        )
     except Exception as e:
-        logger.error(f"Error removing channel title update message: {e}")
+        logger.error("Error removing channel title update message: %s", e)
 
 
 async def handle_mychannel_command(message: Message) -> None:
-    logger.info(f"Mychannel command received from user {message.from_user.id}")
+    logger.info("Mychannel command received from user %s", message.from_user.id)
 
     async for session in get_session():
         user_repo = UserRepository(session)
-        user = await user_repo.get_user_by_telegram_id(message.from_user.id)
+        channel_ids = await user_repo.get_channel_ids(message.from_user.id)
 
-    if not user or not user.channel_id:
+    if not channel_ids:
         await message.answer(MESSAGES["no_channel_configured"])
         return
 
     try:
-        chat = await telegram_bot.get_chat(user.channel_id)
-        await message.answer(
-            MESSAGES["channel_info"].format(
-                title=chat.title, channel_id=user.channel_id
+        channels = []
+        for channel_id in channel_ids:
+            chat = await telegram_bot.get_chat(channel_id)
+            channels.append(
+                MESSAGES["channel_info"].format(
+                    title=chat.title, channel_id=channel_id
+                )
             )
-        )
+        await message.answer("\n\n".join(channels))
     except Exception as e:
-        logger.error(f"Error getting channel info: {str(e)}")
+        logger.error("Error getting channel info: %s", e)
         await message.answer(MESSAGES["channel_config_error"])
 
 
-async def update_channel_with_spotify_info(user_id: int):
-    logger.info(f"Updating channel info for user {user_id}")
+async def handle_removechannel_command(
+    message: Message, command: CommandObject
+) -> None:
+    channel_id = (command.args or "").strip()
+    if not channel_id:
+        await message.answer(MESSAGES["remove_channel_usage"])
+        return
+
+    async for session in get_session():
+        user_repo = UserRepository(session)
+        removed = await user_repo.remove_channel(message.from_user.id, channel_id)
+        remaining = await user_repo.get_channel_ids(message.from_user.id)
+
+    if not removed:
+        await message.answer(
+            MESSAGES["channel_not_found"].format(channel_id=channel_id)
+        )
+        return
+
+    await invalidate_user(message.from_user.id)
+    if not remaining:
+        stop_channel_updates(message.from_user.id)
+    await message.answer(MESSAGES["channel_removed"].format(channel_id=channel_id))
+
+
+async def send_track_photo(
+    channel_id: str, cover_url: str, cover_file: BufferedInputFile, caption: str
+) -> None:
+    """Post track cover, reusing the Telegram file_id of an earlier upload"""
+    file_id = cover_cache.get_file_id(cover_url)
+    if file_id is None and cover_url in pending_photo_uploads:
+        file_id = await asyncio.shield(pending_photo_uploads[cover_url])
+    if file_id is not None:
+        try:
+            await telegram_bot.send_photo(
+                chat_id=channel_id,
+                photo=file_id,
+                caption=caption,
+                parse_mode=PARSE_MODE,
+            )
+            return
+        except TelegramBadRequest as e:
+            if "file" not in e.message.lower():
+                raise
+            logger.warning("Cover file_id rejected, uploading again: %s", e.message)
+            cover_cache.forget_file_id(cover_url)
+
+    upload = pending_photo_uploads[cover_url] = (
+        asyncio.get_running_loop().create_future()
+    )
     try:
-        while True:
-            try:
-                async for session in get_session():
-                    user_repo = UserRepository(session)
-                    user = await user_repo.get_user_by_telegram_id(user_id)
+        sent = await telegram_bot.send_photo(
+            chat_id=channel_id,
+            photo=cover_file,
+            caption=caption,
+            parse_mode=PARSE_MODE,
+        )
+        if sent.photo:
+            file_id = sent.photo[-1].file_id
+            cover_cache.set_file_id(cover_url, file_id)
+    finally:
+        # Waiters fall back to uploading themselves if this upload failed
+        upload.set_result(file_id)
+        pending_photo_uploads.pop(cover_url, None)
 
-                if not user or not user.channel_id or not user.updates_enabled:
-                    break
 
-                access_token = await spotify_service.refresh_access_token(
-                    user.spotify_refresh_token
-                )
-                current_track = await spotify_service.get_current_track(access_token)
-
-                if current_track and current_track != previous_tracks.get(user_id):
-                    logger.info(
-                        f"Updating channel info for: {current_track['title']} - {current_track['artists']}"
-                    )
-
-                    channel_title = (
-                        f"{current_track['title']} - {current_track['artists']}"
-                    )
-                    await telegram_bot.set_chat_title(
-                        chat_id=user.channel_id, title=channel_title[:255]
-                    )
-
-                    album_cover = await spotify_service.download_album_cover(
-                        current_track["album_cover_url"]
-                    )
-                    if album_cover:
-                        duration_min, duration_sec = divmod(
-                            current_track["duration_ms"] // 1000, 60
-                        )
-                        search_text = url_encode(
-                            f"{current_track['title']} {current_track['artists']}"
-                        )
-
-                        caption = MESSAGES["track_info_template"].format(
-                            title=current_track["title"],
-                            artists=current_track["artists"],
-                            album=current_track["album"],
-                            release_date=current_track["release_date"],
-                            duration=f"{duration_min}:{duration_sec:02d}",
-                            track_url=current_track["track_url"],
-                            search_text=search_text,
-                        )
-
-                        await telegram_bot.send_photo(
-                            chat_id=user.channel_id,
-                            photo=FSInputFile(album_cover),
-                            caption=caption,
-                            parse_mode="Markdown",
-                        )
-
-                        await telegram_bot.set_chat_photo(
-                            chat_id=user.channel_id, photo=FSInputFile(album_cover)
-                        )
-                        os.remove(album_cover)
-
-                    previous_tracks[user_id] = current_track
-
-            except Exception as e:
-                logger.error(f"Error in update loop for user {user_id}: {str(e)}")
-                await asyncio.sleep(30)
-                continue
-
-            await asyncio.sleep(settings.SPOTIFY_UPDATE_INTERVAL)
+async def set_channel_title(channel_id: str, title: str) -> None:
+    try:
+        await telegram_bot.set_chat_title(chat_id=channel_id, title=title)
+    except TelegramBadRequest as e:
+        # Already showing it, e.g. when a channel is caught up after a failure
+        if "not modified" not in e.message.lower():
+            raise
+
+
+def track_write_result(
+    user_id: int, track_id: str, channel_id: str, future: asyncio.Future
+) -> None:
+    """Have the next poll send the track again to a channel whose write failed"""
+    if future.cancelled() or future.exception() is not None:
+        playback_states.mark_unsent(user_id, track_id, channel_id)
+
+
+async def publish_track(
+    user_id: int, channel_ids: Sequence[str], track: Track, rendered: RenderedTrack
+) -> None:
+    """Queue channel title, track post and channel photo updates"""
+    logger.info("Updating channel info for: %s - %s", track.title, track.artists)
+
+    def submit(channel_id: str, priority: Priority, call) -> None:
+        # Writes are queued latest-wins per channel: if the user skips on
+        # before they are sent, the stale ones are replaced, not sent
+        future = telegram_outbox.submit(channel_id, priority, call, coalesce=True)
+        future.add_done_callback(
+            functools.partial(
+                track_write_result, user_id, track.track_id, channel_id
+            )
+        )
+
+    for channel_id in channel_ids:
+        submit(
+            channel_id,
+            Priority.TITLE,
+            lambda channel_id=channel_id: set_channel_title(
+                channel_id, rendered.channel_title
+            ),
+        )
+
+    cover_url = track.album_cover_url
+    if not cover_url:
+        return
+    album_cover = None
+    try:
+        album_cover = await spotify_service.download_album_cover(cover_url)
+    finally:
+        # Also when the poll is cancelled at shutdown: no photo gets queued
+        if not album_cover:
+            for channel_id in channel_ids:
+                playback_states.mark_unsent(user_id, track.track_id, channel_id)
+    if not album_cover:
+        return
+
+    # One in-memory buffer serves every upload
+    cover_file = BufferedInputFile(album_cover, filename="cover.jpg")
+    for channel_id in channel_ids:
+        submit(
+            channel_id,
+            Priority.PHOTO,
+            lambda channel_id=channel_id: send_track_photo(
+                channel_id, cover_url, cover_file, rendered.caption
+            ),
+        )
+
+        # Chat photos can't be set by file_id, so the bytes are uploaded
+        submit(
+            channel_id,
+            Priority.CHAT_PHOTO,
+            lambda channel_id=channel_id: telegram_bot.set_chat_photo(
+                chat_id=channel_id, photo=cover_file
+            ),
+        )
+
+
+async def update_channel_with_spotify_info(user_id: int) -> Optional[float]:
+    """Poll Spotify once and update the channel; None stops polling"""
+    state = playback_states.get(user_id)
+    try:
+        user = await user_config_cache.get(user_id)
+
+        if not user or not user.channel_ids or not user.updates_enabled:
+            logger.info("Stopping channel updates for user %s", user_id)
+            playback_states.evict(user_id)
+            return None
+
+        current_track = await spotify_service.get_user_current_track(
+            user_id, user.spotify_refresh_token
+        )
+
+        # One poll per Spotify account; the result fans out to every channel
+        targets: Sequence[str] = ()
+        if current_track:
+            rendered = track_renderer.render(current_track)
+            # Relinked or re-released tracks can differ in ID but render the
+            # same; those only go to channels that have not seen them yet
+            if (
+                current_track.track_id != state.track_id
+                and rendered.render_hash != state.render_hash
+            ):
+                targets = user.channel_ids
+            elif state.channel_ids is not None:
+                # Channels added since the last post catch up on the current track
+                targets = [
+                    channel_id
+                    for channel_id in user.channel_ids
+                    if channel_id not in state.channel_ids
+                ]
+            state.track_id = current_track.track_id
+            state.render_hash = rendered.render_hash
+            state.channel_ids = user.channel_ids
+        if targets:
+            state.unsent = False
+            await publish_track(user_id, targets, current_track, rendered)
+
+        state.error_count = 0
+        delay = poll_policy.next_delay(state, current_track)
+
     except Exception as e:
-        logger.error(f"Fatal error in channel update for user {user_id}: {str(e)}")
-        raise
+        logger.error("Error in update loop for user %s: %s", user_id, e)
+        delay = poll_policy.error_delay(state)
+
+    state.next_due_at = time.time() + delay
+    state.dirty = True
+    return delay
@@ -9,16 +9,17 @@ MESSAGES = {
         "2. Бот добавлен в канал как администратор\n"
         "3. У бота есть права на изменение информации канала"
     ),
+    # HTML; values are escaped by app.bot.rendering
     "track_info_template": (
         "🎵 {title}\n"
         "👤 {artists}\n"
         "💿 {album}\n"
         "📅 {release_date}\n"
         "⏱ {duration}\n"
-        "🔗 [Spotify]({track_url})\n"
-        "🎧 [Яндекс Музыка](https://music.yandex.ru/search?text={search_text})\n"
-        "🎵 [VK Музыка](https://vk.com/audio?q={search_text})\n"
-        "▶️ [YouTube](https://www.youtube.com/results?search_query={search_text})\n\n"
+        '🔗 <a href="{track_url}">Spotify</a>\n'
+        '🎧 <a href="https://music.yandex.ru/search?text={search_text}">Яндекс Музыка</a>\n'
+        '🎵 <a href="https://vk.com/audio?q={search_text}">VK Музыка</a>\n'
+        '▶️ <a href="https://www.youtube.com/results?search_query={search_text}">YouTube</a>\n\n'
     ),
     "channel_configured": "Канал успешно настроен: {channel_title}",
     "no_permission_admin": "У вас нет прав для использования этой команды.",
@@ -27,7 +28,7 @@ MESSAGES = {
     "user_entry_template": (
         "👤 ID пользователя: {user_id}\n"
         "🔑 Токен: {token_display}\n"
-        "📢 Канал: {channel_id}\n"
+        "📢 Каналы: {channel_ids}\n"
         "🔄 Обновления: {updates_enabled}\n"
         "----------------------\n"
     ),
@@ -41,6 +42,9 @@ MESSAGES = {
         "Затем попробуйте /setchannel снова."
     ),
     "channel_info": "Ваш канал:\nНазвание: {title}\nID: {channel_id}",
+    "remove_channel_usage": "Укажите ID канала: /removechannel <ID канала>",
+    "channel_removed": "Канал {channel_id} больше не будет обновляться.",
+    "channel_not_found": "Канал {channel_id} не найден среди ваших каналов.",
     "no_channel_configured": "У вас еще не настроен канал. Используйте /setchannel для настройки.",
     "bot_configured": "Бот настроен! Используйте '🔄 Переключить обновления' чтобы включить/выключить обновления канала.",
     "updates_enabled": "Обновления канала включены! Ваш канал теперь будет обновляться в соответствии с вашей активностью в Spotify.",
@@ -0,0 +1,355 @@
+import asyncio
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from app.config import get_settings
+from app.logger import logger
+from app.metrics import (
+    TELEGRAM_PENDING,
+    TELEGRAM_QUEUE_SECONDS,
+    TELEGRAM_REQUESTS,
+    TELEGRAM_REQUEST_SECONDS,
+)
+
+settings = get_settings()
+
+ChatId = Union[int, str]
+
+
+class Priority(IntEnum):
+    TITLE = 0
+    PHOTO = 1
+    CHAT_PHOTO = 2
+    CLEANUP = 3
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+@dataclass(order=True)
+class OutboundRequest:
+    priority: int
+    seq: int
+    chat_id: ChatId = field(compare=False)
+    call: Callable[[], Awaitable[Any]] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+    coalesce_key: Optional[Tuple[ChatId, int]] = field(default=None, compare=False)
+
+
+@dataclass
+class OutboxMetrics:
+    pending: int
+    in_flight: int
+    sent_total: int
+    failed_total: int
+    throttled_total: int
+    coalesced_total: int
+    last_queue_latency: float
+    max_queue_latency: float
+
+
+class TelegramOutbox:
+    """Rate-limit-aware, latest-wins dispatcher for bot writes to channels"""
+
+    def __init__(
+        self,
+        global_rate: float = settings.TELEGRAM_GLOBAL_RATE,
+        global_burst: float = settings.TELEGRAM_GLOBAL_BURST,
+        chat_rate: float = settings.TELEGRAM_CHAT_RATE,
+        chat_burst: float = settings.TELEGRAM_CHAT_BURST,
+        concurrency: int = settings.TELEGRAM_SEND_CONCURRENCY,
+        max_retries: int = settings.TELEGRAM_SEND_MAX_RETRIES,
+    ):
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global_bucket = TokenBucket(global_rate, global_burst)
+        self._chat_buckets: Dict[ChatId, TokenBucket] = {}
+        self._chat_blocked_until: Dict[ChatId, float] = {}
+        self._busy_chats: Set[ChatId] = set()
+        self._pending: List[OutboundRequest] = []
+        self._coalescing: Dict[Tuple[ChatId, int], OutboundRequest] = {}
+        self._counter = itertools.count()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight: Set[asyncio.Task] = set()
+        self._last_sweep = time.monotonic()
+        self._sent_total = 0
+        self._failed_total = 0
+        self._throttled_total = 0
+        self._coalesced_total = 0
+        self._last_queue_latency = 0.0
+        self._max_queue_latency = 0.0
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._dispatch_loop())
+            TELEGRAM_PENDING.set_function(lambda: len(self._pending))
+            logger.info("Telegram outbox started")
+
+    async def drain(self, timeout: float) -> bool:
+        """Wait until every queued write has been sent or timeout passes"""
+        deadline = time.monotonic() + timeout
+        while self._pending or self._in_flight:
+            if time.monotonic() >= deadline:
+                logger.warning(
+                    "Outbox drain timed out with %s writes left",
+                    len(self._pending) + len(self._in_flight),
+                )
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    async def stop(self) -> None:
+        """Stop dispatching; unsent and in-flight writes are cancelled"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in list(self._in_flight):
+            task.cancel()
+        await asyncio.gather(*self._in_flight, return_exceptions=True)
+        for request in self._pending:
+            request.future.cancel()
+        if self._pending:
+            logger.warning("Dropped %s unsent Telegram writes", len(self._pending))
+        self._pending.clear()
+        self._coalescing.clear()
+        # Run the done callbacks of the cancelled futures before returning
+        await asyncio.sleep(0)
+        logger.info("Telegram outbox stopped")
+
+    def submit(
+        self,
+        chat_id: ChatId,
+        priority: Priority,
+        call: Callable[[], Awaitable[Any]],
+        coalesce: bool = False,
+    ) -> asyncio.Future:
+        """Queue a bot call; the returned future resolves with its result"""
+        key = (chat_id, priority) if coalesce else None
+        if key is not None and key in self._coalescing:
+            # Latest wins: keep the queue position, send the newer call
+            request = self._coalescing[key]
+            request.call = call
+            self._coalesced_total += 1
+            return request.future
+
+        future = asyncio.get_running_loop().create_future()
+        # Failures are logged here; fire-and-forget callers need not await
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        request = OutboundRequest(
+            priority=priority,
+            seq=next(self._counter),
+            chat_id=chat_id,
+            call=call,
+            future=future,
+            enqueued_at=time.monotonic(),
+            coalesce_key=key,
+        )
+        if key is not None:
+            self._coalescing[key] = request
+        heapq.heappush(self._pending, request)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return future
+
+    def set_worker_count(self, workers: int) -> None:
+        """Take an equal share of the bot-wide rate limit shared by all workers"""
+        workers = max(1, workers)
+        bucket = self._global_bucket
+        bucket._refill(time.monotonic())
+        bucket.rate = self.global_rate / workers
+        bucket.capacity = max(1.0, self.global_burst / workers)
+        bucket.tokens = min(bucket.tokens, bucket.capacity)
+
+    def metrics(self) -> OutboxMetrics:
+        return OutboxMetrics(
+            pending=len(self._pending),
+            in_flight=len(self._in_flight),
+            sent_total=self._sent_total,
+            failed_total=self._failed_total,
+            throttled_total=self._throttled_total,
+            coalesced_total=self._coalesced_total,
+            last_queue_latency=self._last_queue_latency,
+            max_queue_latency=self._max_queue_latency,
+        )
+
+    def _chat_bucket(self, chat_id: ChatId) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _chat_wait_time(self, chat_id: ChatId, now: float) -> float:
+        if chat_id in self._busy_chats:
+            return float("inf")
+        blocked = self._chat_blocked_until.get(chat_id, 0) - now
+        return max(blocked, self._chat_bucket(chat_id).wait_time(now))
+
+    def _next_ready(self, now: float):
+        """Pop the best request whose chat may send now, and the wait for the next"""
+        skipped = []
+        ready = None
+        next_wait = float("inf")
+        while self._pending:
+            request = heapq.heappop(self._pending)
+            if request.future.cancelled():
+                if self._coalescing.get(request.coalesce_key) is request:
+                    del self._coalescing[request.coalesce_key]
+                continue
+            wait = self._chat_wait_time(request.chat_id, now)
+            if wait <= 0:
+                ready = request
+                break
+            next_wait = min(next_wait, wait)
+            skipped.append(request)
+        for request in skipped:
+            heapq.heappush(self._pending, request)
+        return ready, next_wait
+
+    async def _dispatch_loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            self._sweep(now)
+
+            request, next_wait = self._next_ready(now)
+            if request is None:
+                timeout = None if next_wait == float("inf") else next_wait
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            global_wait = self._global_bucket.wait_time(now)
+            if global_wait > 0:
+                heapq.heappush(self._pending, request)
+                await asyncio.sleep(global_wait)
+                continue
+
+            await self._semaphore.acquire()
+            now = time.monotonic()
+            self._global_bucket.consume(now)
+            self._chat_bucket(request.chat_id).consume(now)
+            self._busy_chats.add(request.chat_id)
+            if self._coalescing.get(request.coalesce_key) is request:
+                del self._coalescing[request.coalesce_key]
+            task = asyncio.create_task(self._send(request))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, request: OutboundRequest) -> None:
+        started = time.monotonic()
+        if request.attempts == 0:
+            self._last_queue_latency = started - request.enqueued_at
+            self._max_queue_latency = max(
+                self._max_queue_latency, self._last_queue_latency
+            )
+            TELEGRAM_QUEUE_SECONDS.observe(self._last_queue_latency)
+        kind = Priority(request.priority).name.lower()
+        request.attempts += 1
+        try:
+            with TELEGRAM_REQUEST_SECONDS.labels(kind).time():
+                result = await request.call()
+        except TelegramRetryAfter as e:
+            TELEGRAM_REQUESTS.labels(kind, "throttled").inc()
+            self._throttled_total += 1
+            self._chat_blocked_until[request.chat_id] = (
+                time.monotonic() + e.retry_after
+            )
+            logger.warning(
+                "Flood control for chat %s, retrying in %ss",
+                request.chat_id,
+                e.retry_after,
+            )
+            key = request.coalesce_key
+            if key is not None and key in self._coalescing:
+                # A newer state for this chat is already queued
+                self._coalesced_total += 1
+                if not request.future.done():
+                    request.future.set_result(None)
+            elif request.attempts <= self.max_retries:
+                if key is not None:
+                    self._coalescing[key] = request
+                heapq.heappush(self._pending, request)
+            else:
+                self._failed_total += 1
+                logger.error(
+                    "Giving up on chat %s after flood control", request.chat_id
+                )
+                if not request.future.done():
+                    request.future.set_exception(e)
+        except asyncio.CancelledError:
+            request.future.cancel()
+            raise
+        except Exception as e:
+            TELEGRAM_REQUESTS.labels(kind, "failed").inc()
+            self._failed_total += 1
+            logger.error("Error sending to chat %s: %s", request.chat_id, e)
+            if not request.future.done():
+                request.future.set_exception(e)
+        else:
+            TELEGRAM_REQUESTS.labels(kind, "sent").inc()
+            self._sent_total += 1
+            if not request.future.done():
+                request.future.set_result(result)
+        finally:
+            self._busy_chats.discard(request.chat_id)
+            self._semaphore.release()
+            self._wakeup.set()
+
+    def _sweep(self, now: float) -> None:
+        """Drop state for chats that are idle and fully refilled"""
+        if now - self._last_sweep < 60:
+            return
+        self._last_sweep = now
+        for chat_id, bucket in list(self._chat_buckets.items()):
+            if chat_id not in self._busy_chats and bucket.is_full(now):
+                del self._chat_buckets[chat_id]
+        for chat_id, until in list(self._chat_blocked_until.items()):
+            if until <= now:
+                del self._chat_blocked_until[chat_id]
+
+
+telegram_outbox = TelegramOutbox()
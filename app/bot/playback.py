@@ -0,0 +1,160 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Collection, Dict, Optional, Tuple
+
+from app.config import get_settings
+from app.database.connection import get_session
+from app.database.repository import PlaybackStateRepository
+from app.logger import logger
+
+settings = get_settings()
+
+
+@dataclass(slots=True)
+class PlaybackState:
+    """Compact per-user record of what the channel currently shows"""
+
+    track_id: Optional[str] = None
+    render_hash: int = 0
+    idle_streak: int = 0
+    error_count: int = 0
+    next_due_at: Optional[float] = None  # unix time of the next poll
+    dirty: bool = False
+    # Channels showing the current track; None when restored and unknown
+    channel_ids: Optional[Tuple[str, ...]] = None
+    # A write of the current track failed; it is not checkpointed as shown
+    unsent: bool = False
+
+
+class PlaybackStates:
+    """Per-user playback states, checkpointed to the database in batches"""
+
+    def __init__(
+        self, checkpoint_interval: float = settings.PLAYBACK_CHECKPOINT_INTERVAL
+    ):
+        self.checkpoint_interval = checkpoint_interval
+        self._states: Dict[int, PlaybackState] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def get(self, user_id: int) -> PlaybackState:
+        state = self._states.get(user_id)
+        if state is None:
+            state = self._states[user_id] = PlaybackState()
+        return state
+
+    def evict(self, user_id: int) -> None:
+        self._states.pop(user_id, None)
+
+    def mark_unsent(self, user_id: int, track_id: str, channel_id: str) -> None:
+        """Record that channel_id missed track_id so the next poll sends it"""
+        state = self._states.get(user_id)
+        if state is None or state.track_id != track_id:
+            # Evicted, or a newer track replaced it anyway
+            return
+        state.unsent = True
+        state.dirty = True
+        if state.channel_ids is not None:
+            state.channel_ids = tuple(
+                channel for channel in state.channel_ids if channel != channel_id
+            )
+
+    def resume_delay(self, user_id: int) -> Optional[float]:
+        """Seconds until a restored user's next poll, or None if unknown"""
+        state = self._states.get(user_id)
+        if state is None or state.next_due_at is None:
+            return None
+        return max(0.0, state.next_due_at - time.time())
+
+    async def load(self) -> None:
+        """Restore states saved by a previous process"""
+        async for session in get_session():
+            rows = await PlaybackStateRepository(session).get_all_states()
+        for row in rows:
+            self._states[row.telegram_id] = self._from_row(row)
+        logger.info("Restored playback state for %s users", len(rows))
+
+    async def reload(self, user_ids: Collection[int]) -> None:
+        """Replace states with the ones another worker checkpointed"""
+        async for session in get_session():
+            rows = await PlaybackStateRepository(session).get_states(user_ids)
+        for row in rows:
+            self._states[row.telegram_id] = self._from_row(row)
+
+    async def release(self, user_ids: Collection[int]) -> None:
+        """Checkpoint and evict users handed over to another worker"""
+        await self.checkpoint(user_ids)
+        for user_id in user_ids:
+            self.evict(user_id)
+
+    @staticmethod
+    def _from_row(row) -> PlaybackState:
+        next_due_at = None
+        if row.next_due_at:
+            # Stored as naive UTC like the other timestamp columns
+            next_due_at = row.next_due_at.replace(tzinfo=timezone.utc).timestamp()
+        return PlaybackState(
+            track_id=row.track_id,
+            render_hash=row.render_hash,
+            error_count=row.error_count,
+            next_due_at=next_due_at,
+        )
+
+    async def checkpoint(self, user_ids: Optional[Collection[int]] = None) -> None:
+        """Write every changed state, or those of user_ids, in one batch"""
+        if user_ids is None:
+            candidates = self._states.items()
+        else:
+            candidates = [
+                (user_id, self._states[user_id])
+                for user_id in user_ids
+                if user_id in self._states
+            ]
+        dirty = [(user_id, state) for user_id, state in candidates if state.dirty]
+        if not dirty:
+            return
+        rows = []
+        for user_id, state in dirty:
+            state.dirty = False
+            rows.append(
+                {
+                    "telegram_id": user_id,
+                    # After a restart the whole track is sent again
+                    "track_id": None if state.unsent else state.track_id,
+                    "render_hash": 0 if state.unsent else state.render_hash,
+                    "next_due_at": (
+                        datetime.utcfromtimestamp(state.next_due_at)
+                        if state.next_due_at
+                        else None
+                    ),
+                    "error_count": state.error_count,
+                }
+            )
+        try:
+            async for session in get_session():
+                await PlaybackStateRepository(session).bulk_save_states(rows)
+        except Exception as e:
+            for _, state in dirty:
+                state.dirty = True
+            logger.error("Error checkpointing playback state: %s", e)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._checkpoint_loop())
+
+    async def stop(self) -> None:
+        """Stop the checkpoint loop and write the final checkpoint"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.checkpoint()
+
+    async def _checkpoint_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            await self.checkpoint()
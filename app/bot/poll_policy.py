@@ -0,0 +1,51 @@
+from typing import Optional
+
+from app.bot.playback import PlaybackState
+from app.config import get_settings
+from app.services.track import Track
+
+settings = get_settings()
+
+
+class AdaptivePollPolicy:
+    """Chooses the delay until a user's next poll from their playback state"""
+
+    def __init__(
+        self,
+        base_interval: float = settings.SPOTIFY_UPDATE_INTERVAL,
+        min_interval: float = settings.POLL_MIN_INTERVAL,
+        playing_max_interval: Optional[float] = settings.POLL_PLAYING_MAX_INTERVAL,
+        idle_max_interval: float = settings.POLL_IDLE_MAX_INTERVAL,
+        track_end_margin: float = settings.POLL_TRACK_END_MARGIN,
+    ):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        # Polling while playing never gets slower than the fixed interval did,
+        # so skips reach the channel as fast as before
+        self.playing_max_interval = (
+            base_interval if playing_max_interval is None else playing_max_interval
+        )
+        self.idle_max_interval = idle_max_interval
+        self.track_end_margin = track_end_margin
+
+    def next_delay(self, state: PlaybackState, track: Optional[Track]) -> float:
+        if not track or not track.is_playing:
+            streak = state.idle_streak
+            state.idle_streak = streak + 1
+            return min(self.base_interval * 2**streak, self.idle_max_interval)
+
+        state.idle_streak = 0
+        if track.duration_ms <= 0:
+            # Unknown duration (some episodes and local files)
+            return self.playing_max_interval
+        remaining_ms = max(0, track.duration_ms - track.progress_ms)
+        delay = remaining_ms / 1000 + self.track_end_margin
+        return max(self.min_interval, min(delay, self.playing_max_interval))
+
+    def error_delay(self, state: PlaybackState) -> float:
+        """Back off exponentially while polls for a user keep failing"""
+        streak = state.error_count
+        state.error_count = streak + 1
+        return min(
+            settings.SPOTIFY_ERROR_RETRY_INTERVAL * 2**streak, self.idle_max_interval
+        )
@@ -0,0 +1,155 @@
+import html
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from string import Formatter
+from typing import Dict, List, Mapping, Optional, Tuple
+from urllib.parse import quote_plus
+
+from app.bot.messages import MESSAGES
+from app.config import get_settings
+from app.services.track import Track
+
+settings = get_settings()
+
+PARSE_MODE = "HTML"
+MAX_CAPTION_LENGTH = 1024
+MAX_CHANNEL_TITLE_LENGTH = 128
+ELLIPSIS = "…"
+
+# Shortened, longest first, when a caption is over the limit
+TRUNCATABLE_FIELDS = ("title", "artists", "album")
+
+
+def telegram_length(text: str) -> int:
+    """Length as Telegram counts it, in UTF-16 code units"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def truncate(text: str, limit: int) -> str:
+    if telegram_length(text) <= limit:
+        return text
+    while telegram_length(text) > limit - 1:
+        text = text[:-1]
+    return text + ELLIPSIS
+
+
+class CompiledTemplate:
+    """A str.format-style template parsed once"""
+
+    def __init__(self, template: str):
+        self.parts: List[Tuple[str, Optional[str]]] = []
+        # Visible field name -> number of occurrences
+        self.visible_fields: Dict[str, int] = {}
+        visible_literal = []
+        in_tag = False
+        for literal, field_name, _, _ in Formatter().parse(template):
+            for char in literal:
+                if char == "<":
+                    in_tag = True
+                elif char == ">":
+                    in_tag = False
+                elif not in_tag:
+                    visible_literal.append(char)
+            if field_name is not None and not in_tag:
+                self.visible_fields[field_name] = (
+                    self.visible_fields.get(field_name, 0) + 1
+                )
+            self.parts.append((literal, field_name))
+        self.visible_overhead = telegram_length(
+            html.unescape("".join(visible_literal))
+        )
+
+    def render(self, values: Mapping[str, str]) -> str:
+        chunks = []
+        for literal, field_name in self.parts:
+            chunks.append(literal)
+            if field_name is not None:
+                chunks.append(values[field_name])
+        return "".join(chunks)
+
+    def visible_length(self, values: Mapping[str, str]) -> int:
+        """Visible length of the result for unescaped values"""
+        return self.visible_overhead + sum(
+            telegram_length(values[field_name]) * count
+            for field_name, count in self.visible_fields.items()
+        )
+
+
+CAPTION_TEMPLATE = CompiledTemplate(MESSAGES["track_info_template"])
+
+
+@dataclass(frozen=True, slots=True)
+class RenderedTrack:
+    channel_title: str
+    caption: str
+    # Stable across restarts, unlike hash()
+    render_hash: int
+
+
+def render_track(track: Track) -> RenderedTrack:
+    """Build the channel title and the HTML track post caption"""
+    duration_min, duration_sec = divmod(track.duration_ms // 1000, 60)
+    values = {
+        "title": track.title,
+        "artists": track.artists,
+        "album": track.album,
+        "release_date": track.release_date,
+        "duration": f"{duration_min}:{duration_sec:02d}",
+    }
+
+    excess = CAPTION_TEMPLATE.visible_length(values) - MAX_CAPTION_LENGTH
+    while excess > 0:
+        longest = max(TRUNCATABLE_FIELDS, key=lambda name: len(values[name]))
+        length = telegram_length(values[longest])
+        if length <= 1:
+            break
+        values[longest] = truncate(values[longest], max(1, length - excess))
+        excess = CAPTION_TEMPLATE.visible_length(values) - MAX_CAPTION_LENGTH
+
+    escaped = {
+        name: html.escape(value, quote=False) for name, value in values.items()
+    }
+    escaped["track_url"] = html.escape(track.track_url)
+    escaped["search_text"] = html.escape(
+        quote_plus(f"{track.title} {track.artists}")
+    )
+    caption = CAPTION_TEMPLATE.render(escaped)
+
+    channel_title = truncate(
+        f"{track.title} - {track.artists}", MAX_CHANNEL_TITLE_LENGTH
+    )
+    return RenderedTrack(
+        channel_title=channel_title,
+        caption=caption,
+        render_hash=zlib.crc32(f"{channel_title}\n{caption}".encode()),
+    )
+
+
+class TrackRenderer:
+    """Renders tracks, memoized by track ID across all users"""
+
+    def __init__(self, max_entries: int = settings.RENDER_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._rendered: "OrderedDict[str, RenderedTrack]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._rendered)
+
+    def render(self, track: Track) -> RenderedTrack:
+        rendered = self._rendered.get(track.track_id)
+        if rendered is not None:
+            self._rendered.move_to_end(track.track_id)
+            self.hits += 1
+            return rendered
+
+        self.misses += 1
+        rendered = self._rendered[track.track_id] = render_track(track)
+        if len(self._rendered) > self.max_entries:
+            self._rendered.popitem(last=False)
+        return rendered
+
+
+track_renderer = TrackRenderer()
@@ -0,0 +1,223 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from dataclasses import dataclass
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from app.config import get_settings
+from app.logger import logger
+from app.metrics import (
+    ACTIVE_USERS,
+    FIRST_POLL_SECONDS,
+    POLL_LAG_SECONDS,
+    POLL_QUEUE_DEPTH,
+    POLL_SECONDS,
+)
+
+settings = get_settings()
+
+# Poll callback: returns delay in seconds until the next poll, or None to stop
+PollCallback = Callable[[int], Awaitable[Optional[float]]]
+
+
+@dataclass
+class SchedulerMetrics:
+    scheduled_users: int
+    queue_depth: int
+    due_backlog: int
+    in_flight: int
+    last_lag: float
+    max_lag: float
+    polls_total: int
+
+
+class PollScheduler:
+    """Dispatches per-user polls by due time through a bounded worker pool"""
+
+    def __init__(
+        self,
+        workers: int = settings.POLL_WORKERS,
+        queue_size: int = settings.POLL_QUEUE_SIZE,
+        start_jitter: float = settings.POLL_START_JITTER,
+        warmup_rate: float = settings.POLL_WARMUP_RATE,
+    ):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.start_jitter = start_jitter
+        self.warmup_rate = warmup_rate
+        self._poll: Optional[PollCallback] = None
+        self._heap: List[Tuple[float, int, int]] = []
+        # user_id -> sequence number of its live heap entry; stale entries are skipped
+        self._entries: Dict[int, int] = {}
+        self._in_flight: Set[int] = set()
+        self._counter = itertools.count()
+        self._queue: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._timer_task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._last_lag = 0.0
+        self._max_lag = 0.0
+        self._polls_total = 0
+        self._started_at: Optional[float] = None
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def start(self, poll: PollCallback) -> None:
+        """Start the timer task and the worker pool"""
+        if self._tasks:
+            return
+        self._poll = poll
+        self._started_at = time.monotonic()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        ACTIVE_USERS.set_function(lambda: len(self._entries))
+        POLL_QUEUE_DEPTH.set_function(self._queue.qsize)
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._timer_task = asyncio.create_task(self._timer_loop())
+        self._tasks.append(self._timer_task)
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker_loop()))
+        logger.info("Poll scheduler started with %s workers", self.workers)
+
+    async def stop(self, timeout: float = 0.0) -> None:
+        """Stop polling, giving in-flight polls up to timeout seconds to finish"""
+        self._stopping = True
+        if self._timer_task is not None:
+            self._timer_task.cancel()
+        deadline = time.monotonic() + timeout
+        while self._in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._in_flight:
+            logger.warning(
+                "Cancelling %s polls still running at shutdown", len(self._in_flight)
+            )
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._timer_task = None
+        logger.info("Poll scheduler stopped")
+
+    def add(self, user_id: int, delay: Optional[float] = None) -> None:
+        """Schedule user, replacing any existing entry"""
+        # Spread first polls so that bulk registration does not wake in one burst
+        if delay is None:
+            delay = random.uniform(0, self.start_jitter)
+        self._push(user_id, time.monotonic() + delay)
+
+    def add_ramped(self, entries: Iterable[Tuple[int, Optional[float]]]) -> None:
+        """Schedule many users, at most warmup_rate of them due per second"""
+        now = time.monotonic()
+        delays = sorted(
+            (
+                delay if delay is not None else random.uniform(0, self.start_jitter),
+                user_id,
+            )
+            for user_id, delay in entries
+        )
+        for index, (delay, user_id) in enumerate(delays):
+            if self.warmup_rate > 0:
+                delay = max(delay, index / self.warmup_rate)
+            self._push(user_id, now + delay)
+
+    def remove(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+    def metrics(self) -> SchedulerMetrics:
+        now = time.monotonic()
+        return SchedulerMetrics(
+            scheduled_users=len(self._entries),
+            queue_depth=self._queue.qsize() if self._queue else 0,
+            due_backlog=sum(
+                1
+                for due, seq, user_id in self._heap
+                if due <= now and self._entries.get(user_id) == seq
+            ),
+            in_flight=len(self._in_flight),
+            last_lag=self._last_lag,
+            max_lag=self._max_lag,
+            polls_total=self._polls_total,
+        )
+
+    def _push(self, user_id: int, due: float) -> None:
+        seq = next(self._counter)
+        self._entries[user_id] = seq
+        heapq.heappush(self._heap, (due, seq, user_id))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _timer_loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                due, seq, user_id = heapq.heappop(self._heap)
+                if self._entries.get(user_id) != seq:
+                    continue
+                if user_id in self._in_flight:
+                    # Previous poll still running; try again one interval later
+                    self._push(user_id, now + settings.SPOTIFY_UPDATE_INTERVAL)
+                    continue
+                # Blocks when workers fall behind, applying backpressure
+                await self._queue.put((due, seq, user_id))
+                now = time.monotonic()
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker_loop(self) -> None:
+        while True:
+            due, seq, user_id = await self._queue.get()
+            try:
+                # Queued polls are dropped once stopping; their entries remain
+                if self._stopping or self._entries.get(user_id) != seq:
+                    continue
+                started = time.monotonic()
+                self._last_lag = max(0.0, started - due)
+                self._max_lag = max(self._max_lag, self._last_lag)
+                POLL_LAG_SECONDS.observe(self._last_lag)
+                self._in_flight.add(user_id)
+                try:
+                    next_delay = await self._poll(user_id)
+                except Exception as e:
+                    logger.error("Unhandled error polling user %s: %s", user_id, e)
+                    next_delay = settings.SPOTIFY_ERROR_RETRY_INTERVAL
+                finally:
+                    self._in_flight.discard(user_id)
+                    self._polls_total += 1
+                    finished = time.monotonic()
+                    POLL_SECONDS.observe(finished - started)
+                    if self._polls_total == 1:
+                        FIRST_POLL_SECONDS.set(finished - self._started_at)
+                        logger.info(
+                            "First poll completed %.2fs after scheduler start",
+                            finished - self._started_at,
+                        )
+
+                # Only reschedule if the entry was not replaced or removed meanwhile
+                if self._entries.get(user_id) == seq:
+                    if next_delay is None:
+                        del self._entries[user_id]
+                    else:
+                        self._push(user_id, time.monotonic() + next_delay)
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,94 @@
+import asyncio
+import hashlib
+import os
+import socket
+from typing import Awaitable, Callable, Optional, Tuple
+
+from app.config import get_settings
+from app.database.connection import get_session
+from app.database.repository import WorkerLeaseRepository
+from app.logger import logger
+
+settings = get_settings()
+
+
+def _score(worker_id: str, telegram_id: int) -> int:
+    digest = hashlib.blake2b(
+        f"{worker_id}:{telegram_id}".encode(), digest_size=8
+    ).digest()
+    return int.from_bytes(digest, "big")
+
+
+class ShardCoordinator:
+    """Splits users between bot workers by rendezvous hashing over live leases"""
+
+    def __init__(
+        self,
+        enabled: bool = settings.SHARDING_ENABLED,
+        worker_id: Optional[str] = settings.SHARD_WORKER_ID,
+        heartbeat_interval: float = settings.SHARD_HEARTBEAT_INTERVAL,
+        lease_ttl: float = settings.SHARD_LEASE_TTL,
+    ):
+        self.enabled = enabled
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.heartbeat_interval = heartbeat_interval
+        self.lease_ttl = lease_ttl
+        self.workers: Tuple[str, ...] = (self.worker_id,)
+        self._on_rebalance: Optional[Callable[[], Awaitable[None]]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def owns(self, telegram_id: int) -> bool:
+        if not self.enabled or len(self.workers) <= 1:
+            return True
+        owner = max(self.workers, key=lambda worker: _score(worker, telegram_id))
+        return owner == self.worker_id
+
+    async def start(self, on_rebalance: Callable[[], Awaitable[None]]) -> None:
+        self._on_rebalance = on_rebalance
+        if not self.enabled:
+            return
+        await self._refresh()
+        self._task = asyncio.create_task(self._heartbeat_loop())
+        logger.info(
+            "Shard worker %s started, %s live workers",
+            self.worker_id,
+            len(self.workers),
+        )
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        # Releasing the lease lets the other workers take over right away
+        async for session in get_session():
+            await WorkerLeaseRepository(session).release(self.worker_id)
+        logger.info("Shard worker %s released its lease", self.worker_id)
+
+    async def _refresh(self) -> bool:
+        """Renew own lease and reload live workers; True if membership changed"""
+        async for session in get_session():
+            lease_repo = WorkerLeaseRepository(session)
+            await lease_repo.heartbeat(self.worker_id)
+            workers = tuple(await lease_repo.get_live_workers(self.lease_ttl))
+        if self.worker_id not in workers:
+            workers = tuple(sorted(workers + (self.worker_id,)))
+        changed = workers != self.workers
+        self.workers = workers
+        return changed
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                if await self._refresh():
+                    logger.info(
+                        "Shard membership changed: %s", ", ".join(self.workers)
+                    )
+                    await self._on_rebalance()
+            except Exception as e:
+                logger.error("Error in shard heartbeat: %s", e)
+
+
+shard_coordinator = ShardCoordinator()
@@ -1,3 +0,0 @@
-def url_encode(text: str) -> str:
-    """Simple URL encoding for search parameters"""
-    return text.replace(" ", "+").replace("&", "%26").replace("?", "%3F")
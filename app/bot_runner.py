@@ -1,22 +1,160 @@
 import asyncio
-from aiogram import Bot, Dispatcher
-from app.bot import register_handlers
-from app.config import get_settings
-from app.database import init_db
-from app.logger import logger
+import signal
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from aiogram import Bot, Dispatcher
+
+# Worker processes of the cover pool import this module again as __mp_main__,
+# so everything beyond the standard library is imported inside the functions
+
+
+async def wait_for_shutdown(task: asyncio.Task, shutdown: asyncio.Event) -> None:
+    """Wait until task ends by itself or shutdown is requested"""
+    stopping = asyncio.create_task(shutdown.wait())
+    await asyncio.wait((task, stopping), return_when=asyncio.FIRST_COMPLETED)
+    stopping.cancel()
+
+
+async def serve_webhook(
+    dp: "Dispatcher", bot: "Bot", shutdown: asyncio.Event
+) -> None:
+    """Receive updates on the web app, which this process serves as well"""
+    import uvicorn
+    from app.config import get_settings
+    from app.web import web_app
+    from app.web.webhook import telegram_webhook
+
+    settings = get_settings()
+
+    telegram_webhook.attach(
+        web_app,
+        dp,
+        bot,
+        settings.TELEGRAM_WEBHOOK_PATH,
+        settings.TELEGRAM_WEBHOOK_SECRET,
+    )
+    server = uvicorn.Server(
+        uvicorn.Config(
+            web_app,
+            host=settings.UVICORN_HOST,
+            port=settings.UVICORN_PORT,
+            log_level=settings.UVICORN_LOG_LEVEL,
+        )
+    )
+    serving = asyncio.create_task(server.serve())
+    # Every worker registers the same webhook, so this is idempotent. Updates
+    # sent while no worker answers stay queued at Telegram, so the webhook is
+    # not deleted on shutdown.
+    await bot.set_webhook(
+        url=settings.TELEGRAM_WEBHOOK_URL.rstrip("/") + settings.TELEGRAM_WEBHOOK_PATH,
+        secret_token=settings.TELEGRAM_WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    try:
+        await wait_for_shutdown(serving, shutdown)
+    finally:
+        server.should_exit = True
+        await asyncio.gather(serving, return_exceptions=True)
+        await telegram_webhook.stop(settings.SHUTDOWN_POLL_TIMEOUT)
 
-settings = get_settings()
 
 async def main():
+    import_started = time.perf_counter()
+    from aiogram import Bot, Dispatcher
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from app.bot import (
+        register_handlers,
+        poll_scheduler,
+        user_change_listener,
+        telegram_outbox,
+        shard_coordinator,
+        playback_states,
+    )
+    from app.config import get_settings
+    from app.database import init_db, user_write_behind
+    from app.logger import logger
+    from app.metrics import STARTUP_SECONDS, start_metrics_server
+    from app.services import spotify_service
+    from app.services.image_processing import image_processor
+
+    settings = get_settings()
+    import_seconds = time.perf_counter() - import_started
+
+    if settings.TELEGRAM_WEBHOOK_URL and not settings.TELEGRAM_WEBHOOK_SECRET:
+        raise ValueError("TELEGRAM_WEBHOOK_SECRET is required in webhook mode")
+
+    phases = {"imports": import_seconds}
+    started = time.perf_counter()
     await init_db()
+    await spotify_service.start()
+    if settings.BOT_METRICS_PORT:
+        start_metrics_server(settings.BOT_METRICS_PORT)
+    phases["services"] = time.perf_counter() - started
     
-    bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
+    session = None
+    if settings.TELEGRAM_API_URL:
+        session = AiohttpSession(
+            api=TelegramAPIServer.from_base(settings.TELEGRAM_API_URL)
+        )
+    bot = Bot(token=settings.TELEGRAM_BOT_TOKEN, session=session)
     dp = Dispatcher()
     
+    started = time.perf_counter()
     await register_handlers(dp, bot)
+    phases["handlers"] = time.perf_counter() - started
+
+    for phase, seconds in phases.items():
+        STARTUP_SECONDS.labels(phase).set(seconds)
+    logger.info(
+        "Startup took %.2fs (%s)",
+        sum(phases.values()),
+        ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in phases.items()),
+    )
     
-    logger.info("Starting bot...")
-    await dp.start_polling(bot)
+    shutdown = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, shutdown.set)
+
+    try:
+        if not settings.TELEGRAM_POLLING_ENABLED:
+            logger.info("Starting poll-only worker...")
+            await shutdown.wait()
+        elif settings.TELEGRAM_WEBHOOK_URL:
+            logger.info("Starting bot in webhook mode...")
+            await serve_webhook(dp, bot, shutdown)
+        else:
+            logger.info("Starting bot...")
+            # getUpdates is refused while a webhook from webhook mode is set
+            await bot.delete_webhook()
+            polling = asyncio.create_task(
+                dp.start_polling(bot, handle_signals=False)
+            )
+            await wait_for_shutdown(polling, shutdown)
+            if not polling.done():
+                await dp.stop_polling()
+            await polling
+    finally:
+        logger.info("Shutting down...")
+        started = time.perf_counter()
+        # Polls finishing now may still queue posts, so stop them before
+        # draining the outbox. Writes cancelled by the outbox stop mark their
+        # tracks unsent, so the final checkpoint has them sent again on restart
+        await poll_scheduler.stop(settings.SHUTDOWN_POLL_TIMEOUT)
+        await telegram_outbox.drain(settings.SHUTDOWN_DRAIN_TIMEOUT)
+        await telegram_outbox.stop()
+        await playback_states.stop()
+        await shard_coordinator.stop()
+        await user_change_listener.stop()
+        await user_write_behind.stop()
+        await spotify_service.close()
+        image_processor.shutdown()
+        await bot.session.close()
+        logger.info("Shutdown took %.2fs", time.perf_counter() - started)
+
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    asyncio.run(main())
@@ -18,9 +18,80 @@ class Settings(BaseSettings):
     SPOTIFY_REDIRECT_URI: str
     SPOTIFY_SCOPES: str = "user-read-currently-playing user-read-playback-state"
     SPOTIFY_UPDATE_INTERVAL: int = 10  # seconds
+    SPOTIFY_ERROR_RETRY_INTERVAL: int = 30  # seconds
+    SPOTIFY_TOKEN_REFRESH_MARGIN: int = 60  # seconds before expiry
+
+    # Spotify HTTP connection pool settings
+    SPOTIFY_HTTP_POOL_LIMIT: int = 100
+    SPOTIFY_HTTP_POOL_LIMIT_PER_HOST: int = 30
+    SPOTIFY_HTTP_KEEPALIVE_TIMEOUT: float = 30.0  # seconds
+    SPOTIFY_HTTP_DNS_CACHE_TTL: int = 300  # seconds
+
+    # Spotify request resilience settings
+    SPOTIFY_REQUEST_TIMEOUT: float = 5.0  # seconds, whole request incl. body
+    SPOTIFY_CONNECT_TIMEOUT: float = 2.0  # seconds
+    SPOTIFY_MAX_RETRIES: int = 2
+    SPOTIFY_RETRY_BACKOFF: float = 0.5  # seconds, base of jittered backoff
+    SPOTIFY_RETRY_BACKOFF_MAX: float = 5.0  # seconds, longer Retry-After is not retried
+    SPOTIFY_HEDGE_DELAY: Optional[float] = None  # seconds, e.g. 0.5 to enable
+    SPOTIFY_CIRCUIT_FAILURE_THRESHOLD: int = 5  # consecutive failures per host
+    SPOTIFY_CIRCUIT_RESET_TIMEOUT: float = 30.0  # seconds before a probe
+
+    # Poll scheduler settings
+    POLL_WORKERS: int = 50  # max concurrent polls
+    POLL_QUEUE_SIZE: int = 100
+    POLL_START_JITTER: float = 10.0  # seconds
+    POLL_WARMUP_RATE: float = 20.0  # users/s ramped in on startup or rebalance
+
+    # Sharding settings: several bot workers split users between them
+    SHARDING_ENABLED: bool = False
+    SHARD_WORKER_ID: Optional[str] = None  # defaults to hostname:pid
+    SHARD_HEARTBEAT_INTERVAL: float = 10.0  # seconds
+    SHARD_LEASE_TTL: float = 30.0  # seconds without heartbeat before a worker is dead
+    TELEGRAM_POLLING_ENABLED: bool = True  # only one worker may receive updates
+
+    # Webhook mode: Telegram pushes updates to the web app of every bot worker
+    # instead of one worker long polling; set the public base URL to enable
+    TELEGRAM_WEBHOOK_URL: Optional[str] = None  # e.g. https://bot.example.com
+    TELEGRAM_WEBHOOK_PATH: str = "/telegram/webhook"
+    TELEGRAM_WEBHOOK_SECRET: Optional[str] = None  # required in webhook mode
+    TELEGRAM_API_URL: Optional[str] = None  # Bot API server, e.g. a local fake
+
+    # Adaptive poll interval settings
+    POLL_MIN_INTERVAL: float = 2.0  # seconds
+    # Seconds; bounds how late a skip shows up, defaults to SPOTIFY_UPDATE_INTERVAL
+    POLL_PLAYING_MAX_INTERVAL: Optional[float] = None
+    POLL_IDLE_MAX_INTERVAL: float = 300.0  # seconds
+    POLL_TRACK_END_MARGIN: float = 1.0  # seconds after expected track end
+
+    # Telegram outbound rate limits
+    # Bot-wide; split evenly between live shard workers
+    TELEGRAM_GLOBAL_RATE: float = 25.0  # requests per second
+    TELEGRAM_GLOBAL_BURST: float = 30.0
+    TELEGRAM_CHAT_RATE: float = 20 / 60  # requests per second per chat
+    TELEGRAM_CHAT_BURST: float = 5.0
+    TELEGRAM_SEND_CONCURRENCY: int = 10
+    TELEGRAM_SEND_MAX_RETRIES: int = 3
+
+    # Album cover cache settings
+    COVER_CACHE_MEMORY_BYTES: int = 32 * 1024 * 1024
+    COVER_CACHE_DIR: Optional[str] = None  # e.g. data/covers to enable disk tier
+    COVER_CACHE_DISK_BYTES: int = 512 * 1024 * 1024
+    COVER_CACHE_MAX_FILE_IDS: int = 10000
+
+    # Caption rendering settings
+    RENDER_CACHE_SIZE: int = 10000  # rendered tracks kept, shared by all users
+
+    # Album cover processing settings
+    IMAGE_PROCESS_WORKERS: int = 2
+    IMAGE_PROCESS_QUEUE_SIZE: int = 8
+    IMAGE_TARGET_SIZE: int = 512  # px, longest side
+    IMAGE_JPEG_QUALITY: int = 85
 
     # File settings
-    TEMP_ALBUM_COVER: str = "album_cover.jpg"
+    # Deprecated and unused since covers stay in memory; accepted so that
+    # existing .env files keep working, remove in the next release
+    TEMP_ALBUM_COVER: Optional[str] = None
 
     # Database settings
     POSTGRES_USER: Optional[str] = None
@@ -28,14 +99,42 @@ class Settings(BaseSettings):
     POSTGRES_DB: Optional[str] = None
     POSTGRES_HOST: Optional[str] = "localhost"
     POSTGRES_PORT: Optional[str] = "5432"
+    SQLITE_PATH: str = "data/spoticast.db"  # used when PostgreSQL is not set
+
+    # Database connection pool settings (PostgreSQL)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0  # seconds
+    DB_POOL_RECYCLE: int = 1800  # seconds
+    DB_POOL_PRE_PING: bool = True
+    DB_SLOW_CHECKOUT_THRESHOLD: float = 1.0  # seconds, logs a warning
+    SQLITE_BUSY_TIMEOUT: int = 5000  # milliseconds
+
+    # Database caching and batched write settings
+    USER_CACHE_SYNC_INTERVAL: float = 5.0  # seconds, SQLite change polling
+    DB_WRITE_BEHIND_INTERVAL: float = 30.0  # seconds
+    DB_WRITE_BEHIND_MAX_PENDING: int = 1000
+    PLAYBACK_CHECKPOINT_INTERVAL: float = 60.0  # seconds
 
     # Uvicorn settings
     UVICORN_HOST: str = "0.0.0.0"
     UVICORN_PORT: int = 8000
     UVICORN_LOG_LEVEL: str = "info"
 
+    # Graceful shutdown settings; keep their sum below the stop grace period
+    SHUTDOWN_POLL_TIMEOUT: float = 3.0  # seconds for in-flight polls to finish
+    SHUTDOWN_DRAIN_TIMEOUT: float = 5.0  # seconds to send queued Telegram writes
+
+    # Prometheus metrics listener of the bot process; the web app serves /metrics
+    BOT_METRICS_PORT: Optional[int] = 9100
+
     MAX_MESSAGE_LENGTH: int = 4096
 
+    # Logging settings
+    LOG_JSON: bool = False
+    LOG_RATE_LIMIT_BURST: int = 20  # records per message template, 0 disables
+    LOG_RATE_LIMIT_INTERVAL: float = 10.0  # seconds
+
     @property
     def DATABASE_URL(self) -> str:
         """
@@ -52,7 +151,7 @@ class Settings(BaseSettings):
             ]
         ):
             return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
-        return "sqlite+aiosqlite:///data/spoticast.db"
+        return f"sqlite+aiosqlite:///{self.SQLITE_PATH}"
 
     class Config:
         env_file = ".env"
@@ -1,11 +1,31 @@
-from .models import Base
-from .connection import engine, get_session
-from .repository import UserRepository
+from .connection import engine, get_session, get_pool_stats
+from .migrations import run_migrations
+from .repository import (
+    UserRepository,
+    WorkerLeaseRepository,
+    PlaybackStateRepository,
+)
+from .cache import UserConfig, user_config_cache, invalidate_user
+from .notifications import UserChangeListener
+from .write_behind import UserWriteBehind, user_write_behind
 
 
 async def init_db():
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
 
 
-__all__ = ["init_db", "get_session", "UserRepository"]
+__all__ = [
+    "init_db",
+    "get_session",
+    "get_pool_stats",
+    "UserRepository",
+    "WorkerLeaseRepository",
+    "PlaybackStateRepository",
+    "UserConfig",
+    "user_config_cache",
+    "invalidate_user",
+    "UserChangeListener",
+    "UserWriteBehind",
+    "user_write_behind",
+]
@@ -0,0 +1,81 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.logger import logger
+from .connection import get_session
+from .models import User
+from .notifications import publish_user_changed
+from .repository import UserRepository
+
+
+@dataclass
+class UserConfig:
+    telegram_id: int
+    spotify_refresh_token: Optional[str]
+    channel_ids: Tuple[str, ...]
+    updates_enabled: bool
+
+    @classmethod
+    def from_user(cls, user: User, channel_ids: Sequence[str]) -> "UserConfig":
+        return cls(
+            telegram_id=user.telegram_id,
+            spotify_refresh_token=user.spotify_refresh_token,
+            channel_ids=tuple(channel_ids),
+            updates_enabled=bool(user.updates_enabled),
+        )
+
+
+class UserConfigCache:
+    """In-process cache of the user settings read by the polling loop"""
+
+    def __init__(self):
+        self._configs: Dict[int, UserConfig] = {}
+
+    def __len__(self) -> int:
+        return len(self._configs)
+
+    def values(self) -> List[UserConfig]:
+        return list(self._configs.values())
+
+    async def warm(self) -> None:
+        """Load users with updates enabled; others are loaded on first use"""
+        configs = {}
+        async for session in get_session():
+            user_repo = UserRepository(session)
+            channels = await user_repo.get_active_channel_ids()
+            async for row in user_repo.stream_active_users():
+                configs[row.telegram_id] = UserConfig(
+                    telegram_id=row.telegram_id,
+                    spotify_refresh_token=row.spotify_refresh_token,
+                    channel_ids=tuple(channels.get(row.telegram_id, ())),
+                    updates_enabled=bool(row.updates_enabled),
+                )
+        self._configs = configs
+        logger.info("User config cache warmed with %s users", len(self._configs))
+
+    async def get(self, telegram_id: int) -> Optional[UserConfig]:
+        config = self._configs.get(telegram_id)
+        if config is not None:
+            return config
+
+        async for session in get_session():
+            user_repo = UserRepository(session)
+            user = await user_repo.get_user_by_telegram_id(telegram_id)
+            channel_ids = await user_repo.get_channel_ids(telegram_id) if user else []
+        if not user:
+            return None
+        config = UserConfig.from_user(user, channel_ids)
+        self._configs[telegram_id] = config
+        return config
+
+    def invalidate(self, telegram_id: int) -> None:
+        self._configs.pop(telegram_id, None)
+
+
+user_config_cache = UserConfigCache()
+
+
+async def invalidate_user(telegram_id: int) -> None:
+    """Drop the cached config locally and tell other processes to do the same"""
+    user_config_cache.invalidate(telegram_id)
+    await publish_user_changed(telegram_id)
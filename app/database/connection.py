@@ -1,15 +1,97 @@
+import time
+from dataclasses import dataclass
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from typing import AsyncGenerator
 from app.config import get_settings
+from app.logger import logger
+from app.metrics import DB_CHECKOUT_SECONDS, DB_CONNECTIONS_IN_USE
 
 settings = get_settings()
 
-engine = create_async_engine(settings.DATABASE_URL, echo=False, future=True)
+
+def _engine_options() -> dict:
+    if settings.DATABASE_URL.startswith("postgresql"):
+        return {
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+            "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        }
+    # sqlite3's own lock timeout, in seconds
+    return {"connect_args": {"timeout": settings.SQLITE_BUSY_TIMEOUT / 1000}}
+
+
+engine = create_async_engine(
+    settings.DATABASE_URL, echo=False, future=True, **_engine_options()
+)
 
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
+@dataclass
+class PoolStats:
+    checkouts_total: int = 0
+    checked_out: int = 0
+    max_checked_out: int = 0
+    last_checkout_wait: float = 0.0
+    max_checkout_wait: float = 0.0
+    total_checkout_wait: float = 0.0
+    pool_size: int = 0
+    overflow: int = 0
+
+
+pool_stats = PoolStats()
+DB_CONNECTIONS_IN_USE.set_function(lambda: pool_stats.checked_out)
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # The bot and web processes share one SQLite file: WAL lets readers run
+    # alongside a writer and busy_timeout makes writers wait instead of failing
+    if engine.dialect.name != "sqlite":
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT)}")
+    cursor.close()
+
+
+@event.listens_for(engine.sync_engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_stats.checkouts_total += 1
+    pool_stats.checked_out += 1
+    pool_stats.max_checked_out = max(
+        pool_stats.max_checked_out, pool_stats.checked_out
+    )
+
+
+@event.listens_for(engine.sync_engine, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    pool_stats.checked_out = max(0, pool_stats.checked_out - 1)
+
+
+def get_pool_stats() -> PoolStats:
+    pool = engine.sync_engine.pool
+    if hasattr(pool, "size"):
+        pool_stats.pool_size = pool.size()
+        pool_stats.overflow = pool.overflow()
+    return pool_stats
+
+
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session() as session:
+        # Acquire the connection up front to measure how long callers wait
+        started = time.perf_counter()
+        await session.connection()
+        wait = time.perf_counter() - started
+        pool_stats.last_checkout_wait = wait
+        pool_stats.max_checkout_wait = max(pool_stats.max_checkout_wait, wait)
+        pool_stats.total_checkout_wait += wait
+        DB_CHECKOUT_SECONDS.observe(wait)
+        if wait > settings.DB_SLOW_CHECKOUT_THRESHOLD:
+            logger.warning("Waited %.2fs for a database connection", wait)
         yield session
@@ -0,0 +1,78 @@
+from typing import Callable, List, Tuple
+
+from datetime import datetime
+
+from sqlalchemy import exists, func, insert, inspect, literal, select, text
+from sqlalchemy.engine import Connection
+
+from app.logger import logger
+from .models import Base, SchemaVersion, User, UserChannel
+
+# create_all creates missing tables (and their indexes) but never alters an
+# existing table. Changes to tables that already exist in deployed databases
+# go here as numbered, idempotent steps.
+
+
+def _create_users_active_index(conn: Connection) -> None:
+    for index in User.__table__.indexes:
+        if index.name == "ix_users_active":
+            index.create(conn, checkfirst=True)
+
+
+def _backfill_user_channels(conn: Connection) -> None:
+    conn.execute(
+        insert(UserChannel).from_select(
+            ["telegram_id", "channel_id", "created_at"],
+            select(User.telegram_id, User.channel_id, literal(datetime.utcnow())).where(
+                User.channel_id.isnot(None),
+                ~exists().where(
+                    UserChannel.telegram_id == User.telegram_id,
+                    UserChannel.channel_id == User.channel_id,
+                ),
+            ),
+        )
+    )
+
+
+def _add_users_last_seen_at(conn: Connection) -> None:
+    columns = {column["name"] for column in inspect(conn).get_columns("users")}
+    if "last_seen_at" in columns:
+        return
+    column_type = User.__table__.c.last_seen_at.type.compile(conn.dialect)
+    conn.execute(text(f"ALTER TABLE users ADD COLUMN last_seen_at {column_type}"))
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "add partial index for active users", _create_users_active_index),
+    (2, "copy channels of existing users to user_channels", _backfill_user_channels),
+    (3, "add users.last_seen_at", _add_users_last_seen_at),
+]
+
+
+# Arbitrary application-wide key for pg_advisory_xact_lock
+MIGRATION_LOCK_ID = 0x5370C457
+
+
+def _lock_schema(conn: Connection) -> None:
+    """Hold off other processes migrating until this transaction ends"""
+    if conn.dialect.name == "postgresql":
+        conn.execute(select(func.pg_advisory_xact_lock(MIGRATION_LOCK_ID)))
+    elif conn.dialect.name == "sqlite":
+        # sqlite3 runs DDL outside a transaction until something starts one;
+        # take the write lock up front so create_all is covered too
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def run_migrations(conn: Connection) -> None:
+    """Create missing tables and apply pending migrations under a schema lock"""
+    # The bot and web app both migrate at startup; the lock must come first
+    _lock_schema(conn)
+    Base.metadata.create_all(conn)
+
+    applied = set(conn.execute(select(SchemaVersion.version)).scalars())
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info("Applying database migration %s: %s", version, description)
+        migrate(conn)
+        conn.execute(insert(SchemaVersion).values(version=version))
@@ -1,4 +1,14 @@
-from sqlalchemy import Column, BigInteger, String, DateTime, Boolean
+from sqlalchemy import (
+    Column,
+    BigInteger,
+    String,
+    DateTime,
+    Boolean,
+    Integer,
+    Index,
+    PrimaryKeyConstraint,
+    text,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
@@ -10,10 +20,76 @@ class User(Base):
 
     telegram_id = Column(BigInteger, primary_key=True)
     spotify_refresh_token = Column(String)
+    # First of the user's channels, so "has a channel" stays one column
     channel_id = Column(String)
     updates_enabled = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    last_seen_at = Column(DateTime)
+
+    __table_args__ = (
+        # Partial index covering the startup scan and get_configured_users
+        Index(
+            "ix_users_active",
+            "updates_enabled",
+            "telegram_id",
+            postgresql_where=text(
+                "spotify_refresh_token IS NOT NULL AND channel_id IS NOT NULL"
+            ),
+            sqlite_where=text(
+                "spotify_refresh_token IS NOT NULL AND channel_id IS NOT NULL"
+            ),
+        ),
+    )
 
     def __repr__(self):
         return f"<User telegram_id={self.telegram_id}>"
+
+
+class UserChannel(Base):
+    """Channel mirroring a user's Spotify playback; a user may have several"""
+
+    __tablename__ = "user_channels"
+
+    telegram_id = Column(BigInteger, nullable=False)
+    channel_id = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (PrimaryKeyConstraint("telegram_id", "channel_id"),)
+
+    def __repr__(self):
+        return (
+            f"<UserChannel telegram_id={self.telegram_id} "
+            f"channel_id={self.channel_id}>"
+        )
+
+
+class UserPlaybackState(Base):
+    __tablename__ = "playback_state"
+
+    telegram_id = Column(BigInteger, primary_key=True)
+    track_id = Column(String)
+    render_hash = Column(BigInteger, default=0, nullable=False)
+    next_due_at = Column(DateTime, index=True)
+    error_count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<UserPlaybackState telegram_id={self.telegram_id}>"
+
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    version = Column(Integer, primary_key=True)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+
+class WorkerLease(Base):
+    __tablename__ = "worker_leases"
+
+    worker_id = Column(String, primary_key=True)
+    heartbeat_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<WorkerLease worker_id={self.worker_id}>"
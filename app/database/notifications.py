@@ -0,0 +1,145 @@
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import func, select, text
+
+from app.config import get_settings
+from app.logger import logger
+from .connection import engine, get_session
+from .models import User
+
+settings = get_settings()
+
+USER_CHANGED_CHANNEL = "spoticast_user_changed"
+
+
+def is_postgres() -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+async def publish_user_changed(telegram_id: int) -> None:
+    """Notify other processes that a user's settings changed"""
+    # On SQLite listeners poll users.updated_at instead
+    if not is_postgres():
+        return
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": USER_CHANGED_CHANNEL, "payload": str(telegram_id)},
+            )
+    except Exception as e:
+        logger.error("Error publishing change for user %s: %s", telegram_id, e)
+
+
+class UserChangeListener:
+    """Calls back with telegram_id whenever another process changes a user"""
+
+    def __init__(
+        self,
+        poll_interval: float = settings.USER_CACHE_SYNC_INTERVAL,
+        max_reconnect_delay: float = 60.0,
+    ):
+        self.poll_interval = poll_interval
+        self.max_reconnect_delay = max_reconnect_delay
+        self._callback: Optional[Callable[[int], None]] = None
+        self._on_reconnect: Optional[Callable[[], Awaitable[None]]] = None
+        self._connection = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(
+        self,
+        callback: Callable[[int], None],
+        on_reconnect: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> None:
+        self._callback = callback
+        self._on_reconnect = on_reconnect
+        if is_postgres():
+            await self._listen()
+            self._task = asyncio.create_task(self._watch_loop())
+        else:
+            self._task = asyncio.create_task(self._poll_loop())
+        logger.info("User change listener started")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+    async def _listen(self) -> None:
+        import asyncpg
+
+        dsn = settings.DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://")
+        self._connection = await asyncpg.connect(dsn)
+        await self._connection.add_listener(USER_CHANGED_CHANNEL, self._on_notify)
+
+    async def _watch_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                # Also catches dead peers that never closed the socket
+                await asyncio.wait_for(
+                    self._connection.fetchval("SELECT 1"), self.poll_interval
+                )
+                continue
+            except Exception as e:
+                logger.warning("User change listener connection lost: %s", e)
+            await self._reconnect()
+
+    async def _reconnect(self) -> None:
+        delay = self.poll_interval
+        while True:
+            if self._connection is not None:
+                # close() could wait on a dead network
+                self._connection.terminate()
+                self._connection = None
+            try:
+                await self._listen()
+                break
+            except Exception as e:
+                logger.error("Error reconnecting user change listener: %s", e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+        logger.info("User change listener reconnected")
+        # Notifications sent while disconnected are lost
+        if self._on_reconnect is not None:
+            try:
+                await self._on_reconnect()
+            except Exception as e:
+                logger.error("Error resyncing users after reconnect: %s", e)
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        try:
+            self._callback(int(payload))
+        except ValueError:
+            logger.error("Invalid user change payload: %s", payload)
+
+    async def _poll_loop(self) -> None:
+        watermark = await self._latest_update() or datetime.min
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                async for session in get_session():
+                    result = await session.execute(
+                        select(User.telegram_id, User.updated_at).where(
+                            User.updated_at > watermark
+                        )
+                    )
+                    rows = result.all()
+                for telegram_id, updated_at in rows:
+                    self._callback(telegram_id)
+                    watermark = max(watermark, updated_at)
+            except Exception as e:
+                logger.error("Error polling user changes: %s", e)
+
+    async def _latest_update(self) -> Optional[datetime]:
+        async for session in get_session():
+            result = await session.execute(select(func.max(User.updated_at)))
+            latest = result.scalar()
+        return latest
@@ -1,7 +1,17 @@
-from sqlalchemy import select
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Row
 from sqlalchemy.ext.asyncio import AsyncSession
-from .models import User
-from typing import Optional, List
+from .models import User, UserChannel, UserPlaybackState, WorkerLease
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, List
+
+ACTIVE_USER_COLUMNS = (
+    User.telegram_id,
+    User.spotify_refresh_token,
+    User.channel_id,
+    User.updates_enabled,
+)
 
 
 class UserRepository:
@@ -29,14 +39,70 @@ class UserRepository:
         await self.session.commit()
         return True
 
-    async def save_channel_id(self, telegram_id: int, channel_id: str) -> bool:
+    async def add_channel(self, telegram_id: int, channel_id: str) -> bool:
+        """Add a channel to the user's channels; the first also becomes primary"""
         user = await self.get_user_by_telegram_id(telegram_id)
         if not user:
             return False
-        user.channel_id = channel_id
+        existing = await self.session.get(UserChannel, (telegram_id, channel_id))
+        if existing is None:
+            self.session.add(
+                UserChannel(telegram_id=telegram_id, channel_id=channel_id)
+            )
+        if not user.channel_id:
+            user.channel_id = channel_id
+        # Other processes on SQLite only see changes to users.updated_at
+        user.updated_at = datetime.utcnow()
+        await self.session.commit()
+        return True
+
+    async def remove_channel(self, telegram_id: int, channel_id: str) -> bool:
+        """Remove one of the user's channels, promoting another to primary"""
+        user = await self.get_user_by_telegram_id(telegram_id)
+        channel = await self.session.get(UserChannel, (telegram_id, channel_id))
+        if not user or channel is None:
+            return False
+        await self.session.delete(channel)
+        await self.session.flush()
+        if user.channel_id == channel_id:
+            remaining = await self.get_channel_ids(telegram_id)
+            user.channel_id = remaining[0] if remaining else None
+        user.updated_at = datetime.utcnow()
         await self.session.commit()
         return True
 
+    async def get_channel_ids(self, telegram_id: int) -> List[str]:
+        result = await self.session.execute(
+            select(UserChannel.channel_id)
+            .where(UserChannel.telegram_id == telegram_id)
+            .order_by(UserChannel.created_at)
+        )
+        return list(result.scalars())
+
+    async def get_active_channel_ids(self) -> Dict[int, List[str]]:
+        """Channels of every user with updates enabled, in one query"""
+        return await self._channel_ids_by_user(
+            User.spotify_refresh_token.isnot(None),
+            User.channel_id.isnot(None),
+            User.updates_enabled.is_(True),
+        )
+
+    async def get_all_channel_ids(self) -> Dict[int, List[str]]:
+        """Channels of every user, in one query"""
+        return await self._channel_ids_by_user()
+
+    async def _channel_ids_by_user(self, *conditions) -> Dict[int, List[str]]:
+        result = await self.session.execute(
+            select(UserChannel.telegram_id, UserChannel.channel_id)
+            .join(User, User.telegram_id == UserChannel.telegram_id)
+            .where(*conditions)
+            .order_by(UserChannel.telegram_id, UserChannel.created_at)
+        )
+        channels: Dict[int, List[str]] = {}
+        for telegram_id, channel_id in result:
+            channels.setdefault(telegram_id, []).append(channel_id)
+        return channels
+
     async def get_all_users(self) -> List[User]:
         result = await self.session.execute(select(User))
         return result.scalars().all()
@@ -57,3 +123,152 @@ class UserRepository:
         user.updates_enabled = not user.updates_enabled
         await self.session.commit()
         return user.updates_enabled
+
+    async def stream_active_users(self, batch_size: int = 1000) -> AsyncIterator[Row]:
+        """Stream polling columns of users with updates enabled in batches"""
+        result = await self.session.stream(
+            select(*ACTIVE_USER_COLUMNS)
+            .where(
+                User.spotify_refresh_token.isnot(None),
+                User.channel_id.isnot(None),
+                User.updates_enabled.is_(True),
+            )
+            .execution_options(yield_per=batch_size)
+        )
+        async for row in result:
+            yield row
+
+    async def bulk_save_refresh_tokens(self, tokens: Dict[int, str]) -> None:
+        """Upsert refresh tokens for many users in one statement"""
+        if not tokens:
+            return
+        stmt = dialect_insert(self.session)(User)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[User.telegram_id],
+            set_={
+                "spotify_refresh_token": stmt.excluded.spotify_refresh_token,
+                "updated_at": datetime.utcnow(),
+            },
+        )
+        await self.session.execute(
+            stmt,
+            [
+                {"telegram_id": telegram_id, "spotify_refresh_token": token}
+                for telegram_id, token in tokens.items()
+            ],
+        )
+        await self.session.commit()
+
+    async def bulk_update(self, values: Dict[int, Dict[str, object]]) -> None:
+        """Update columns of many existing users by primary key in one batch"""
+        if not values:
+            return
+        await self.session.execute(
+            update(User),
+            [
+                {"telegram_id": telegram_id, **columns}
+                for telegram_id, columns in values.items()
+            ],
+        )
+        await self.session.commit()
+
+    async def touch_users(self, last_seen: Dict[int, datetime]) -> None:
+        """Record when users were last seen, leaving updated_at alone"""
+        if not last_seen:
+            return
+        users = User.__table__
+        # updated_at is the change signal on SQLite; keep it from bumping
+        stmt = (
+            update(users)
+            .where(users.c.telegram_id == bindparam("user_id"))
+            .values(last_seen_at=bindparam("seen_at"), updated_at=users.c.updated_at)
+        )
+        await self.session.execute(
+            stmt,
+            [
+                {"user_id": telegram_id, "seen_at": seen_at}
+                for telegram_id, seen_at in last_seen.items()
+            ],
+        )
+        await self.session.commit()
+
+
+def dialect_insert(session: AsyncSession):
+    """Dialect-specific INSERT supporting ON CONFLICT"""
+    if session.bind.dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
+
+
+class PlaybackStateRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_all_states(self) -> List[UserPlaybackState]:
+        result = await self.session.execute(select(UserPlaybackState))
+        return result.scalars().all()
+
+    async def get_states(
+        self, telegram_ids: Iterable[int], batch_size: int = 500
+    ) -> List[UserPlaybackState]:
+        telegram_ids = list(telegram_ids)
+        states = []
+        for start in range(0, len(telegram_ids), batch_size):
+            result = await self.session.execute(
+                select(UserPlaybackState).where(
+                    UserPlaybackState.telegram_id.in_(
+                        telegram_ids[start : start + batch_size]
+                    )
+                )
+            )
+            states.extend(result.scalars().all())
+        return states
+
+    async def bulk_save_states(self, states: List[Dict[str, Any]]) -> None:
+        """Upsert many playback state rows in one statement"""
+        if not states:
+            return
+        stmt = dialect_insert(self.session)(UserPlaybackState)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserPlaybackState.telegram_id],
+            set_={
+                "track_id": stmt.excluded.track_id,
+                "render_hash": stmt.excluded.render_hash,
+                "next_due_at": stmt.excluded.next_due_at,
+                "error_count": stmt.excluded.error_count,
+                "updated_at": datetime.utcnow(),
+            },
+        )
+        await self.session.execute(stmt, states)
+        await self.session.commit()
+
+
+class WorkerLeaseRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def heartbeat(self, worker_id: str) -> None:
+        lease = await self.session.get(WorkerLease, worker_id)
+        if not lease:
+            lease = WorkerLease(worker_id=worker_id)
+            self.session.add(lease)
+        lease.heartbeat_at = datetime.utcnow()
+        await self.session.commit()
+
+    async def get_live_workers(self, lease_ttl: float) -> List[str]:
+        """Return live worker IDs and drop leases that expired"""
+        cutoff = datetime.utcnow() - timedelta(seconds=lease_ttl)
+        await self.session.execute(
+            delete(WorkerLease).where(WorkerLease.heartbeat_at < cutoff)
+        )
+        await self.session.commit()
+        result = await self.session.execute(
+            select(WorkerLease.worker_id).order_by(WorkerLease.worker_id)
+        )
+        return [row[0] for row in result.all()]
+
+    async def release(self, worker_id: str) -> None:
+        await self.session.execute(
+            delete(WorkerLease).where(WorkerLease.worker_id == worker_id)
+        )
+        await self.session.commit()
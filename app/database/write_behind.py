@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, Optional
+
+from app.config import get_settings
+from app.logger import logger
+from .connection import get_session
+from .repository import UserRepository
+
+settings = get_settings()
+
+
+class UserWriteBehind:
+    """Buffers user updates that may be lost on a crash and writes them in batches"""
+
+    def __init__(
+        self,
+        flush_interval: float = settings.DB_WRITE_BEHIND_INTERVAL,
+        max_pending: int = settings.DB_WRITE_BEHIND_MAX_PENDING,
+    ):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[int, Dict[str, object]] = {}
+        self._last_seen: Dict[int, datetime] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def update(self, telegram_id: int, **columns) -> None:
+        self._pending.setdefault(telegram_id, {}).update(columns)
+        self._check_size()
+
+    def touch(self, telegram_id: int) -> None:
+        self._last_seen[telegram_id] = datetime.utcnow()
+        self._check_size()
+
+    def _check_size(self) -> None:
+        size = len(self._pending) + len(self._last_seen)
+        if size >= self.max_pending and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        if not self._pending and not self._last_seen:
+            return
+        pending, self._pending = self._pending, {}
+        last_seen, self._last_seen = self._last_seen, {}
+        try:
+            async for session in get_session():
+                user_repo = UserRepository(session)
+                await user_repo.bulk_update(pending)
+                await user_repo.touch_users(last_seen)
+        except Exception as e:
+            logger.error(
+                "Error flushing %s buffered user updates: %s",
+                len(pending) + len(last_seen),
+                e,
+            )
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+
+user_write_behind = UserWriteBehind()
@@ -1,11 +1,132 @@
+import atexit
+import json
 import logging
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
 from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "file": f"{record.filename}:{record.lineno}",
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets through at most `burst` records per message template per interval"""
+
+    def __init__(
+        self,
+        burst: int,
+        interval: float,
+        emit: Optional[Callable[[logging.LogRecord], None]] = None,
+    ):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.emit = emit
+        self._lock = threading.Lock()
+        # (template, level) -> [window start, records seen, last suppressed]
+        self._windows: Dict[Tuple[str, int], List] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+        # Per-user messages share a %-style template
+        key = (str(record.msg), record.levelno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is not None and now - window[0] >= self.interval:
+                self._summarize(window)
+                window = None
+            if window is None:
+                window = self._windows[key] = [now, 0, None]
+            window[1] += 1
+            if window[1] <= self.burst:
+                return True
+            window[2] = record
+            return False
+
+    def flush(self, force: bool = False) -> None:
+        """Report and drop closed windows, or all of them when forced"""
+        now = time.monotonic()
+        with self._lock:
+            closed = [
+                key
+                for key, window in self._windows.items()
+                if force or now - window[0] >= self.interval
+            ]
+            for key in closed:
+                self._summarize(self._windows.pop(key))
+
+    def _summarize(self, window: List) -> None:
+        _, count, last = window
+        if last is None or self.emit is None:
+            return
+        summary = logging.makeLogRecord(last.__dict__)
+        summary.msg = "%s [%s similar suppressed]"
+        summary.args = (last.getMessage(), count - self.burst)
+        summary.exc_info = summary.exc_text = None
+        self.emit(summary)
+
+
+class LazyQueueHandler(QueueHandler):
+    """Queues records unformatted; the in-process listener formats them"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+_listener: Optional[QueueListener] = None
+_rate_limit: Optional[RateLimitFilter] = None
+_flusher: Optional[threading.Thread] = None
+_flusher_stopped = threading.Event()
+
+
+def _flush_loop(rate_limit: RateLimitFilter) -> None:
+    while not _flusher_stopped.wait(rate_limit.interval):
+        rate_limit.flush()
+
+
+def stop_listener() -> None:
+    """Report suppressed counts, flush queued records and stop the listener"""
+    global _listener, _rate_limit, _flusher
+    if _flusher is not None:
+        _flusher_stopped.set()
+        _flusher.join()
+        _flusher = None
+    if _rate_limit is not None:
+        _rate_limit.flush(force=True)
+        _rate_limit = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_listener)
 
 
 def setup_logger(name: str = __name__, log_level: int = logging.INFO) -> logging.Logger:
+    global _listener, _rate_limit, _flusher
+
     if not os.path.exists("logs"):
         os.makedirs("logs")
 
@@ -15,10 +136,16 @@ def setup_logger(name: str = __name__, log_level: int = logging.INFO) -> logging
     if logger.hasHandlers():
         logger.handlers.clear()
 
-    file_formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s"
-    )
-    console_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    if settings.LOG_JSON:
+        file_formatter = console_formatter = JsonFormatter()
+    else:
+        file_formatter = logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - "
+            "[%(filename)s:%(lineno)d] - %(message)s"
+        )
+        console_formatter = logging.Formatter(
+            "%(asctime)s - %(levelname)s - %(message)s"
+        )
 
     log_file = f'logs/spoticast_{datetime.now().strftime("%Y-%m-%d")}.log'
     file_handler = RotatingFileHandler(
@@ -33,8 +160,30 @@ def setup_logger(name: str = __name__, log_level: int = logging.INFO) -> logging
     console_handler.setFormatter(console_formatter)
     console_handler.setLevel(log_level)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    # Callers only enqueue; a listener thread formats and writes the records
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    logger.addHandler(queue_handler)
+
+    stop_listener()
+    _listener = QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+    _listener.start()
+
+    if settings.LOG_RATE_LIMIT_BURST > 0:
+        # Summaries skip the filter and go straight to the queue
+        _rate_limit = RateLimitFilter(
+            settings.LOG_RATE_LIMIT_BURST,
+            settings.LOG_RATE_LIMIT_INTERVAL,
+            emit=queue_handler.emit,
+        )
+        queue_handler.addFilter(_rate_limit)
+        _flusher_stopped.clear()
+        _flusher = threading.Thread(
+            target=_flush_loop, args=(_rate_limit,), daemon=True
+        )
+        _flusher.start()
 
     return logger
 
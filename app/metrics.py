@@ -0,0 +1,132 @@
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+
+# Spotify
+SPOTIFY_REQUEST_SECONDS = Histogram(
+    "spoticast_spotify_request_seconds",
+    "Latency of Spotify API requests",
+    ["endpoint"],
+)
+SPOTIFY_RESPONSES = Counter(
+    "spoticast_spotify_responses_total",
+    "Spotify API responses by status code",
+    ["endpoint", "status"],
+)
+SPOTIFY_TOKEN_REFRESHES = Counter(
+    "spoticast_spotify_token_refreshes_total",
+    "Access token refreshes",
+    ["result"],
+)
+SPOTIFY_RETRIES = Counter(
+    "spoticast_spotify_retries_total",
+    "Spotify API requests retried",
+    ["endpoint", "reason"],
+)
+SPOTIFY_HEDGED_REQUESTS = Counter(
+    "spoticast_spotify_hedged_requests_total",
+    "Spotify API requests duplicated because the first was slow",
+    ["endpoint"],
+)
+CIRCUIT_BREAKER_STATE = Gauge(
+    "spoticast_circuit_breaker_state",
+    "Upstream circuit state: 0 closed, 1 half-open, 2 open",
+    ["host"],
+)
+CIRCUIT_BREAKER_REJECTIONS = Counter(
+    "spoticast_circuit_breaker_rejections_total",
+    "Requests failed fast because the upstream circuit was open",
+    ["host"],
+)
+
+# Telegram
+TELEGRAM_REQUEST_SECONDS = Histogram(
+    "spoticast_telegram_request_seconds",
+    "Latency of Telegram writes",
+    ["kind"],
+)
+TELEGRAM_QUEUE_SECONDS = Histogram(
+    "spoticast_telegram_queue_seconds",
+    "Time Telegram writes wait in the outbox",
+)
+TELEGRAM_REQUESTS = Counter(
+    "spoticast_telegram_requests_total",
+    "Telegram writes by outcome",
+    ["kind", "result"],
+)
+TELEGRAM_PENDING = Gauge(
+    "spoticast_telegram_pending",
+    "Telegram writes waiting in the outbox",
+)
+TELEGRAM_WEBHOOK_UPDATES = Counter(
+    "spoticast_telegram_webhook_updates_total",
+    "Updates received on the Telegram webhook by outcome",
+    ["result"],
+)
+TELEGRAM_WEBHOOK_SECONDS = Histogram(
+    "spoticast_telegram_webhook_seconds",
+    "Time spent processing a webhook update in the background",
+)
+
+# Polling
+POLL_LAG_SECONDS = Histogram(
+    "spoticast_poll_lag_seconds",
+    "Delay between a poll's due time and its start",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+POLL_SECONDS = Histogram(
+    "spoticast_poll_seconds",
+    "Duration of a single user poll",
+)
+POLL_QUEUE_DEPTH = Gauge(
+    "spoticast_poll_queue_depth",
+    "Due polls waiting for a worker",
+)
+ACTIVE_USERS = Gauge(
+    "spoticast_active_users",
+    "Users scheduled for polling in this process",
+)
+FIRST_POLL_SECONDS = Gauge(
+    "spoticast_first_poll_seconds",
+    "Time from scheduler start to the first completed poll",
+)
+
+# Startup
+STARTUP_SECONDS = Gauge(
+    "spoticast_startup_seconds",
+    "Duration of each bot startup phase",
+    ["phase"],
+)
+
+# Album covers
+COVER_CACHE_REQUESTS = Counter(
+    "spoticast_cover_cache_requests_total",
+    "Album cover cache lookups",
+    ["result"],
+)
+
+# Database
+DB_CHECKOUT_SECONDS = Histogram(
+    "spoticast_db_checkout_seconds",
+    "Time spent waiting for a database connection",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+DB_CONNECTIONS_IN_USE = Gauge(
+    "spoticast_db_connections_in_use",
+    "Database connections checked out of the pool",
+)
+
+
+def start_metrics_server(port: int) -> None:
+    """Serve /metrics from a background thread"""
+    start_http_server(port)
+
+
+def render_metrics() -> bytes:
+    return generate_latest()
+
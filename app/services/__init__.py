@@ -1,3 +1,4 @@
-from .spotify import SpotifyService
+from .spotify import SpotifyService, spotify_service
+from .track import Track
 
-__all__ = ["SpotifyService"]
+__all__ = ["SpotifyService", "spotify_service", "Track"]
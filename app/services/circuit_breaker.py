@@ -0,0 +1,78 @@
+import time
+from enum import IntEnum
+from typing import Optional
+
+from app.logger import logger
+from app.metrics import CIRCUIT_BREAKER_REJECTIONS, CIRCUIT_BREAKER_STATE
+
+
+class CircuitState(IntEnum):
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request to a host whose circuit is open"""
+
+    def __init__(self, host: str):
+        super().__init__(f"Circuit open for {host}")
+        self.host = host
+
+
+class CircuitBreaker:
+    """Stops calling an upstream host after consecutive failures"""
+
+    def __init__(self, host: str, failure_threshold: int, reset_timeout: float):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_started_at: Optional[float] = None
+        CIRCUIT_BREAKER_STATE.labels(host).set(self.state)
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == CircuitState.CLOSED:
+            return True
+        if self.state == CircuitState.OPEN:
+            if now - self._opened_at < self.reset_timeout:
+                CIRCUIT_BREAKER_REJECTIONS.labels(self.host).inc()
+                return False
+            self._set_state(CircuitState.HALF_OPEN)
+        # Half-open: one probe at a time; a probe that never reported back
+        # (e.g. cancelled) is replaced after reset_timeout
+        if (
+            self._probe_started_at is not None
+            and now - self._probe_started_at < self.reset_timeout
+        ):
+            CIRCUIT_BREAKER_REJECTIONS.labels(self.host).inc()
+            return False
+        self._probe_started_at = now
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probe_started_at = None
+        if self.state != CircuitState.CLOSED:
+            self._set_state(CircuitState.CLOSED)
+            logger.info("Circuit for %s closed", self.host)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_started_at = None
+        if self.state == CircuitState.HALF_OPEN or (
+            self.state == CircuitState.CLOSED
+            and self.failures >= self.failure_threshold
+        ):
+            self._opened_at = time.monotonic()
+            self._set_state(CircuitState.OPEN)
+            logger.warning(
+                "Circuit for %s opened after %s failures", self.host, self.failures
+            )
+
+    def _set_state(self, state: CircuitState) -> None:
+        self.state = state
+        CIRCUIT_BREAKER_STATE.labels(self.host).set(state)
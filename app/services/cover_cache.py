@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Set
+
+from app.config import get_settings
+from app.logger import logger
+from app.metrics import COVER_CACHE_REQUESTS
+
+settings = get_settings()
+
+
+@dataclass
+class CoverCacheStats:
+    hits: int
+    disk_hits: int
+    misses: int
+    memory_bytes: int
+    memory_items: int
+    disk_bytes: int
+    disk_items: int
+    file_ids: int
+
+
+class CoverCache:
+    """Album cover cache keyed by image URL, in memory and on disk"""
+
+    def __init__(
+        self,
+        max_memory_bytes: int = settings.COVER_CACHE_MEMORY_BYTES,
+        disk_dir: Optional[str] = settings.COVER_CACHE_DIR,
+        max_disk_bytes: int = settings.COVER_CACHE_DISK_BYTES,
+        max_file_ids: int = settings.COVER_CACHE_MAX_FILE_IDS,
+    ):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.max_file_ids = max_file_ids
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        # Disk entries reserved by a put whose file is still being written
+        self._writing: Set[str] = set()
+        self._file_ids: "OrderedDict[str, str]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir:
+            self._load_disk_index()
+
+    @staticmethod
+    def key_for(url: str) -> str:
+        # Spotify cover URLs address immutable images
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    async def get(self, url: str) -> Optional[bytes]:
+        key = self.key_for(url)
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            COVER_CACHE_REQUESTS.labels("memory_hit").inc()
+            return data
+
+        if key in self._disk and key not in self._writing:
+            try:
+                data = await asyncio.to_thread(self._read_file, key)
+            except OSError as e:
+                logger.error("Error reading cached cover %s: %s", key, e)
+                self._forget_disk(key)
+            else:
+                self._disk.move_to_end(key)
+                self._store_memory(key, data)
+                self.hits += 1
+                self.disk_hits += 1
+                COVER_CACHE_REQUESTS.labels("disk_hit").inc()
+                return data
+
+        self.misses += 1
+        COVER_CACHE_REQUESTS.labels("miss").inc()
+        return None
+
+    async def put(self, url: str, data: bytes) -> None:
+        key = self.key_for(url)
+        self._store_memory(key, data)
+        if self.disk_dir and key not in self._disk and len(data) <= self.max_disk_bytes:
+            # Reserved before the write so that concurrent puts write it once
+            self._disk[key] = len(data)
+            self._disk_bytes += len(data)
+            self._writing.add(key)
+            try:
+                await asyncio.to_thread(self._write_file, key, data)
+            except OSError as e:
+                logger.error("Error writing cached cover %s: %s", key, e)
+                self._forget_disk(key)
+                return
+            finally:
+                self._writing.discard(key)
+            await self._evict_disk()
+
+    def get_file_id(self, url: str) -> Optional[str]:
+        key = self.key_for(url)
+        file_id = self._file_ids.get(key)
+        if file_id is not None:
+            self._file_ids.move_to_end(key)
+        return file_id
+
+    def set_file_id(self, url: str, file_id: str) -> None:
+        key = self.key_for(url)
+        self._file_ids[key] = file_id
+        self._file_ids.move_to_end(key)
+        while len(self._file_ids) > self.max_file_ids:
+            self._file_ids.popitem(last=False)
+
+    def forget_file_id(self, url: str) -> None:
+        self._file_ids.pop(self.key_for(url), None)
+
+    def stats(self) -> CoverCacheStats:
+        return CoverCacheStats(
+            hits=self.hits,
+            disk_hits=self.disk_hits,
+            misses=self.misses,
+            memory_bytes=self._memory_bytes,
+            memory_items=len(self._memory),
+            disk_bytes=self._disk_bytes,
+            disk_items=len(self._disk),
+            file_ids=len(self._file_ids),
+        )
+
+    def _store_memory(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    async def _evict_disk(self) -> None:
+        while self._disk_bytes > self.max_disk_bytes:
+            # Oldest entry whose file is complete
+            key = next((key for key in self._disk if key not in self._writing), None)
+            if key is None:
+                break
+            self._forget_disk(key)
+            try:
+                await asyncio.to_thread(os.remove, self._path(key))
+            except OSError as e:
+                logger.error("Error evicting cached cover %s: %s", key, e)
+
+    def _forget_disk(self, key: str) -> None:
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key)
+
+    def _read_file(self, key: str) -> bytes:
+        path = self._path(key)
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)
+        return data
+
+    def _write_file(self, key: str, data: bytes) -> None:
+        tmp_path = self._path(key) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+
+    def _load_disk_index(self) -> None:
+        os.makedirs(self.disk_dir, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        logger.info(
+            "Cover cache loaded %s covers (%s bytes) from %s",
+            len(self._disk),
+            self._disk_bytes,
+            self.disk_dir,
+        )
+
+
+cover_cache = CoverCache()
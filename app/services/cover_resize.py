@@ -0,0 +1,17 @@
+import io
+
+# Kept free of app imports: this module is all a cover pool worker loads
+
+
+def resize_cover(data: bytes, max_size: int, quality: int) -> bytes:
+    """Downscale and re-encode a cover as JPEG; runs in a worker process"""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB")
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=quality, optimize=True)
+    resized = output.getvalue()
+    # Never upload something bigger than what we started with
+    return resized if len(resized) < len(data) else data
@@ -0,0 +1,79 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from app.config import get_settings
+from app.logger import logger
+from app.services.cover_resize import resize_cover
+
+settings = get_settings()
+
+
+def pool_context():
+    """Start workers from a forkserver with only the resize code preloaded"""
+    # Forking would copy the event loop and the app's loaded dependencies
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["app.services.cover_resize"])
+    return context
+
+
+class ImageProcessor:
+    """Runs cover decoding and encoding in a bounded process pool"""
+
+    def __init__(
+        self,
+        workers: int = settings.IMAGE_PROCESS_WORKERS,
+        queue_size: int = settings.IMAGE_PROCESS_QUEUE_SIZE,
+        max_size: int = settings.IMAGE_TARGET_SIZE,
+        quality: int = settings.IMAGE_JPEG_QUALITY,
+    ):
+        self.workers = workers
+        self.max_size = max_size
+        self.quality = quality
+        # Further callers wait for a slot instead of growing the executor backlog
+        self._slots = asyncio.Semaphore(workers + queue_size)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=pool_context()
+            )
+        return self._executor
+
+    async def process_cover(self, data: bytes) -> bytes:
+        """Return the cover downscaled to the target size, or as-is on failure"""
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            executor = self._get_executor()
+            try:
+                return await loop.run_in_executor(
+                    executor,
+                    resize_cover,
+                    data,
+                    self.max_size,
+                    self.quality,
+                )
+            except BrokenProcessPool as e:
+                # e.g. a worker killed by the OOM killer; the next call starts
+                # a new pool. Every job queued on the broken one lands here,
+                # only the first drops it.
+                if self._executor is executor:
+                    logger.error("Cover process pool broke, restarting it: %s", e)
+                    self.shutdown()
+                return data
+            except Exception as e:
+                logger.error("Error processing album cover: %s", e)
+                return data
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+image_processor = ImageProcessor()
@@ -1,11 +1,138 @@
-from aiohttp import ClientSession
+from aiohttp import (
+    ClientError,
+    ClientResponse,
+    ClientSession,
+    ClientTimeout,
+    TCPConnector,
+    TraceConfig,
+)
+import asyncio
 import base64
-from typing import Optional, Dict, Any
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
 from app.config import get_settings
+from app.database.cache import invalidate_user
+from app.database.connection import get_session
+from app.database.repository import UserRepository
 from app.logger import logger
+from app.metrics import (
+    SPOTIFY_HEDGED_REQUESTS,
+    SPOTIFY_REQUEST_SECONDS,
+    SPOTIFY_RESPONSES,
+    SPOTIFY_RETRIES,
+    SPOTIFY_TOKEN_REFRESHES,
+)
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.track import Track
 
 settings = get_settings()
 
+# Reads the body of a successful response
+ResponseReader = Callable[[ClientResponse], Awaitable[Any]]
+# (status, body of a 200 response, Retry-After in seconds)
+AttemptResult = Tuple[int, Any, Optional[float]]
+
+
+class SpotifyAPIError(Exception):
+    """Raised when the Spotify API answers with an unexpected status"""
+
+    def __init__(self, endpoint: str, status: int):
+        super().__init__(f"{endpoint} returned status {status}")
+        self.endpoint = endpoint
+        self.status = status
+
+
+def _metrics_trace_config() -> TraceConfig:
+    """Record latency and status of every request, labelled by endpoint"""
+
+    def endpoint(ctx) -> str:
+        return (ctx.trace_request_ctx or {}).get("endpoint", "other")
+
+    async def on_request_start(session, ctx, params):
+        ctx.started = time.perf_counter()
+
+    async def on_request_end(session, ctx, params):
+        SPOTIFY_REQUEST_SECONDS.labels(endpoint(ctx)).observe(
+            time.perf_counter() - ctx.started
+        )
+        SPOTIFY_RESPONSES.labels(endpoint(ctx), str(params.response.status)).inc()
+
+    async def on_request_exception(session, ctx, params):
+        SPOTIFY_RESPONSES.labels(endpoint(ctx), "error").inc()
+
+    trace_config = TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
+
+
+@dataclass
+class CachedToken:
+    access_token: str
+    refresh_token: str
+    expires_at: float
+
+
+class TokenCache:
+    """Per-user cache of Spotify access tokens"""
+
+    def __init__(self, spotify_service: "SpotifyService"):
+        self.spotify_service = spotify_service
+        self.refresh_margin = settings.SPOTIFY_TOKEN_REFRESH_MARGIN
+        self._tokens: Dict[int, CachedToken] = {}
+        self._pending: Dict[int, asyncio.Task] = {}
+
+    async def get_access_token(
+        self, user_id: int, refresh_token: str
+    ) -> Optional[str]:
+        """Return a valid access token, refreshing it shortly before expiry"""
+        cached = self._tokens.get(user_id)
+        if (
+            cached
+            and cached.refresh_token == refresh_token
+            and cached.expires_at - self.refresh_margin > time.monotonic()
+        ):
+            return cached.access_token
+
+        # Concurrent callers for the same user share one in-flight refresh
+        task = self._pending.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self._refresh(user_id, refresh_token))
+            self._pending[user_id] = task
+            task.add_done_callback(lambda _: self._pending.pop(user_id, None))
+        return await asyncio.shield(task)
+
+    def invalidate(self, user_id: int) -> None:
+        self._tokens.pop(user_id, None)
+
+    async def _refresh(self, user_id: int, refresh_token: str) -> Optional[str]:
+        token_data = await self.spotify_service.request_access_token(refresh_token)
+        if not token_data or "access_token" not in token_data:
+            SPOTIFY_TOKEN_REFRESHES.labels("failure").inc()
+            self._tokens.pop(user_id, None)
+            return None
+        SPOTIFY_TOKEN_REFRESHES.labels("success").inc()
+
+        # Spotify may rotate the refresh token; the old one stops working
+        new_refresh_token = token_data.get("refresh_token") or refresh_token
+        if new_refresh_token != refresh_token:
+            logger.info("Persisting rotated refresh token for user %s", user_id)
+            async for session in get_session():
+                user_repo = UserRepository(session)
+                await user_repo.save_refresh_token(user_id, new_refresh_token)
+            await invalidate_user(user_id)
+
+        self._tokens[user_id] = CachedToken(
+            access_token=token_data["access_token"],
+            refresh_token=new_refresh_token,
+            expires_at=time.monotonic() + token_data.get("expires_in", 3600),
+        )
+        return token_data["access_token"]
+
 
 class SpotifyService:
     def __init__(self):
@@ -15,6 +142,168 @@ class SpotifyService:
         self.token_url = settings.SPOTIFY_TOKEN_URL
         self.api_url = settings.SPOTIFY_API_URL
         self.redirect_uri = settings.SPOTIFY_REDIRECT_URI
+        self.token_cache = TokenCache(self)
+        self._cover_downloads: Dict[str, asyncio.Task] = {}
+        self.max_retries = settings.SPOTIFY_MAX_RETRIES
+        self.hedge_delay = settings.SPOTIFY_HEDGE_DELAY
+        self._session: Optional[ClientSession] = None
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    async def start(self) -> None:
+        """Open the shared HTTP session used by every request"""
+        if self._session is not None and not self._session.closed:
+            return
+        connector = TCPConnector(
+            limit=settings.SPOTIFY_HTTP_POOL_LIMIT,
+            limit_per_host=settings.SPOTIFY_HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=settings.SPOTIFY_HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=settings.SPOTIFY_HTTP_DNS_CACHE_TTL,
+            use_dns_cache=True,
+        )
+        self._session = ClientSession(
+            connector=connector,
+            timeout=ClientTimeout(
+                total=settings.SPOTIFY_REQUEST_TIMEOUT,
+                sock_connect=settings.SPOTIFY_CONNECT_TIMEOUT,
+            ),
+            trace_configs=[_metrics_trace_config()],
+        )
+        logger.info("Spotify HTTP session started")
+
+    async def close(self) -> None:
+        """Close the shared HTTP session and its pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("Spotify HTTP session closed")
+        self._session = None
+
+    async def get_http_session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    def _breaker(self, url: str) -> CircuitBreaker:
+        host = urlsplit(url).netloc
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = self._breakers[host] = CircuitBreaker(
+                host,
+                failure_threshold=settings.SPOTIFY_CIRCUIT_FAILURE_THRESHOLD,
+                reset_timeout=settings.SPOTIFY_CIRCUIT_RESET_TIMEOUT,
+            )
+        return breaker
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        endpoint: str,
+        read: ResponseReader,
+        retry: bool = True,
+        hedge: bool = False,
+        **kwargs: Any,
+    ) -> Tuple[int, Any]:
+        """Send a request with retries, hedging and a per-host circuit breaker"""
+        breaker = self._breaker(url)
+        max_retries = self.max_retries if retry else 0
+        for attempt in range(max_retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(breaker.host)
+            retry_after = None
+            try:
+                if hedge and self.hedge_delay is not None:
+                    result = await self._hedged_attempt(
+                        method, url, endpoint, read, kwargs
+                    )
+                else:
+                    result = await self._attempt(method, url, endpoint, read, kwargs)
+            except (asyncio.TimeoutError, ClientError) as e:
+                breaker.record_failure()
+                if attempt == max_retries:
+                    raise
+                reason = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+            else:
+                status, body, retry_after = result
+                if status != 429 and status < 500:
+                    breaker.record_success()
+                    return status, body
+                breaker.record_failure()
+                if attempt == max_retries or (
+                    retry_after is not None
+                    and retry_after > settings.SPOTIFY_RETRY_BACKOFF_MAX
+                ):
+                    return status, body
+                reason = str(status)
+
+            SPOTIFY_RETRIES.labels(endpoint, reason).inc()
+            if retry_after is None:
+                # Full jitter keeps retries of many users from synchronising
+                retry_after = random.uniform(
+                    0,
+                    min(
+                        settings.SPOTIFY_RETRY_BACKOFF_MAX,
+                        settings.SPOTIFY_RETRY_BACKOFF * 2**attempt,
+                    ),
+                )
+            await asyncio.sleep(retry_after)
+
+    async def _attempt(
+        self,
+        method: str,
+        url: str,
+        endpoint: str,
+        read: ResponseReader,
+        kwargs: Dict[str, Any],
+    ) -> AttemptResult:
+        session = await self.get_http_session()
+        async with session.request(
+            method, url, trace_request_ctx={"endpoint": endpoint}, **kwargs
+        ) as response:
+            body = await read(response) if response.status == 200 else None
+            retry_after = response.headers.get("Retry-After")
+            return (
+                response.status,
+                body,
+                float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+
+    async def _hedged_attempt(
+        self,
+        method: str,
+        url: str,
+        endpoint: str,
+        read: ResponseReader,
+        kwargs: Dict[str, Any],
+    ) -> AttemptResult:
+        """Race a second copy of a request that is slower than the hedge delay"""
+        tasks = [
+            asyncio.create_task(self._attempt(method, url, endpoint, read, kwargs))
+        ]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay)
+            if done:
+                return tasks[0].result()
+
+            SPOTIFY_HEDGED_REQUESTS.labels(endpoint).inc()
+            tasks.append(
+                asyncio.create_task(
+                    self._attempt(method, url, endpoint, read, kwargs)
+                )
+            )
+            pending = set(tasks)
+            while True:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                if not pending:
+                    # Both copies failed; raise the error of the last one
+                    return done.pop().result()
+        finally:
+            for task in tasks:
+                task.cancel()
 
     def get_auth_url(self, state: str) -> str:
         """Generate Spotify authorization URL"""
@@ -39,86 +328,125 @@ class SpotifyService:
                 f"{self.client_id}:{self.client_secret}".encode()
             ).decode()
 
-            async with ClientSession() as session:
-                async with session.post(
-                    self.token_url,
-                    headers={
-                        "Authorization": f"Basic {auth_header}",
-                        "Content-Type": "application/x-www-form-urlencoded",
-                    },
-                    data={
-                        "grant_type": "authorization_code",
-                        "code": code,
-                        "redirect_uri": self.redirect_uri,
-                    },
-                ) as response:
-                    token_data = await response.json()
-                    return token_data.get("refresh_token")
+            # Authorization codes are single-use, so this is never retried
+            _, token_data = await self._request(
+                "POST",
+                self.token_url,
+                "token",
+                lambda response: response.json(),
+                retry=False,
+                headers={
+                    "Authorization": f"Basic {auth_header}",
+                    "Content-Type": "application/x-www-form-urlencoded",
+                },
+                data={
+                    "grant_type": "authorization_code",
+                    "code": code,
+                    "redirect_uri": self.redirect_uri,
+                },
+            )
+            return token_data.get("refresh_token") if token_data else None
         except Exception as e:
-            logger.error(f"Error exchanging code for token: {str(e)}")
+            logger.error("Error exchanging code for token: %s", e)
             return None
 
-    async def refresh_access_token(self, refresh_token: str) -> Optional[str]:
-        """Get new access token using refresh token"""
+    async def get_access_token(
+        self, user_id: int, refresh_token: str
+    ) -> Optional[str]:
+        """Get cached access token for user, refreshing it when needed"""
+        return await self.token_cache.get_access_token(user_id, refresh_token)
+
+    async def request_access_token(
+        self, refresh_token: str
+    ) -> Optional[Dict[str, Any]]:
+        """Request token endpoint with refresh token and return raw token data"""
         try:
             auth_header = base64.b64encode(
                 f"{self.client_id}:{self.client_secret}".encode()
             ).decode()
 
-            async with ClientSession() as session:
-                async with session.post(
-                    self.token_url,
-                    headers={"Authorization": f"Basic {auth_header}"},
-                    data={
-                        "grant_type": "refresh_token",
-                        "refresh_token": refresh_token,
-                    },
-                ) as response:
-                    token_data = await response.json()
-                    return token_data.get("access_token")
+            status, token_data = await self._request(
+                "POST",
+                self.token_url,
+                "token",
+                lambda response: response.json(),
+                headers={"Authorization": f"Basic {auth_header}"},
+                data={
+                    "grant_type": "refresh_token",
+                    "refresh_token": refresh_token,
+                },
+            )
+            if status != 200:
+                logger.error("Token endpoint returned status %s", status)
+                return None
+            return token_data
         except Exception as e:
-            logger.error(f"Error refreshing access token: {str(e)}")
+            logger.error("Error refreshing access token: %s", e)
             return None
 
-    async def get_current_track(self, access_token: str) -> Optional[Dict[str, Any]]:
-        """Get user's currently playing track"""
-        try:
-            async with ClientSession() as session:
-                async with session.get(
-                    f"{self.api_url}/me/player/currently-playing",
-                    headers={"Authorization": f"Bearer {access_token}"},
-                ) as response:
-                    if response.status == 204:
-                        return None
-
-                    track_data = await response.json()
-                    return {
-                        "title": track_data["item"]["name"],
-                        "artists": ", ".join(
-                            [artist["name"] for artist in track_data["item"]["artists"]]
-                        ),
-                        "album": track_data["item"]["album"]["name"],
-                        "release_date": track_data["item"]["album"]["release_date"],
-                        "duration_ms": track_data["item"]["duration_ms"],
-                        "album_cover_url": track_data["item"]["album"]["images"][0][
-                            "url"
-                        ],
-                        "track_url": track_data["item"]["external_urls"]["spotify"],
-                    }
-        except Exception as e:
-            logger.error(f"Error fetching current track: {str(e)}")
+    async def get_current_track(self, access_token: str) -> Optional[Track]:
+        """Get user's currently playing track or episode; failures raise"""
+        status, body = await self._request(
+            "GET",
+            f"{self.api_url}/me/player/currently-playing",
+            "currently_playing",
+            lambda response: response.read(),
+            hedge=True,
+            params={"additional_types": "track,episode"},
+            headers={"Authorization": f"Bearer {access_token}"},
+        )
+        if status == 204:
             return None
+        if status != 200:
+            raise SpotifyAPIError("currently_playing", status)
+        return Track.from_json(body)
 
-    async def download_album_cover(self, url: str) -> Optional[str]:
+    async def get_user_current_track(
+        self, user_id: int, refresh_token: str
+    ) -> Optional[Track]:
+        """get_current_track with the user's cached access token"""
+        access_token = await self.get_access_token(user_id, refresh_token)
         try:
-            async with ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        cover_filename = settings.TEMP_ALBUM_COVER
-                        with open(cover_filename, "wb") as f:
-                            f.write(await response.read())
-                        return cover_filename
-            return None
+            return await self.get_current_track(access_token)
+        except SpotifyAPIError as e:
+            # A token Spotify rejects (e.g. revoked) is refreshed once
+            if e.status != 401:
+                raise
+            logger.info("Access token of user %s rejected, refreshing", user_id)
+            self.token_cache.invalidate(user_id)
+            access_token = await self.get_access_token(user_id, refresh_token)
+            return await self.get_current_track(access_token)
+
+    async def download_album_cover(self, url: str) -> Optional[bytes]:
+        """Download album cover into memory, downscaled for upload"""
+        # Concurrent callers for the same URL share one download
+        task = self._cover_downloads.get(url)
+        if task is None:
+            task = asyncio.create_task(self._download_album_cover(url))
+            self._cover_downloads[url] = task
+            task.add_done_callback(lambda _: self._cover_downloads.pop(url, None))
+        return await asyncio.shield(task)
+
+    async def _download_album_cover(self, url: str) -> Optional[bytes]:
+        # Only the bot downloads covers; the web app never loads these
+        from app.services.cover_cache import cover_cache
+        from app.services.image_processing import image_processor
+
+        cached = await cover_cache.get(url)
+        if cached is not None:
+            return cached
+        try:
+            status, data = await self._request(
+                "GET", url, "cover", lambda response: response.read()
+            )
+            if status != 200:
+                return None
+            data = await image_processor.process_cover(data)
+            await cover_cache.put(url, data)
+            return data
         except Exception as e:
-            logger.error(f"Error downloading album cover: {str(e)}")
+            logger.error("Error downloading album cover: %s", e)
             return None
+
+
+spotify_service = SpotifyService()
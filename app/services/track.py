@@ -0,0 +1,77 @@
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+try:
+    import orjson
+except ImportError:  # optional, speeds up decoding currently-playing payloads
+    orjson = None
+
+if orjson is not None:
+    loads = orjson.loads
+else:
+    loads = json.loads
+
+SPOTIFY_WEB_URL = "https://open.spotify.com"
+
+
+@dataclass(slots=True, frozen=True)
+class Track:
+    """What is playing, reduced to the fields the bot uses"""
+
+    track_id: str
+    title: str
+    artists: str
+    album: str
+    release_date: str
+    duration_ms: int
+    progress_ms: int
+    is_playing: bool
+    album_cover_url: Optional[str]
+    track_url: str
+    is_episode: bool = False
+
+    @classmethod
+    def from_json(cls, raw: bytes) -> Optional["Track"]:
+        """Parse a currently-playing response body"""
+        return cls.from_dict(loads(raw))
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> Optional["Track"]:
+        """Build a Track from a decoded response, or None during ads and the like"""
+        item = data.get("item")
+        if not item:
+            return None
+
+        is_episode = item.get("type") == "episode"
+        if is_episode:
+            # The show stands in for the album and its publisher for the artists
+            show = item.get("show") or {}
+            artists = show.get("publisher") or ""
+            album = show.get("name") or ""
+            release_date = item.get("release_date") or ""
+            images = item.get("images") or show.get("images")
+        else:
+            album_data = item.get("album") or {}
+            artists = ", ".join(artist["name"] for artist in item.get("artists") or ())
+            album = album_data.get("name") or ""
+            release_date = album_data.get("release_date") or ""
+            images = album_data.get("images")
+
+        title = item.get("name") or ""
+        return cls(
+            # Local files have no Spotify ID
+            track_id=item.get("id") or item.get("uri") or f"{artists}:{title}",
+            title=title,
+            artists=artists,
+            album=album,
+            release_date=release_date,
+            duration_ms=item.get("duration_ms") or 0,
+            progress_ms=data.get("progress_ms") or 0,
+            is_playing=bool(data.get("is_playing")),
+            # Spotify lists images largest first
+            album_cover_url=images[0]["url"] if images else None,
+            track_url=(item.get("external_urls") or {}).get("spotify")
+            or SPOTIFY_WEB_URL,
+            is_episode=is_episode,
+        )
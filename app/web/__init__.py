@@ -1,3 +1,5 @@
 from .routes import app as web_app
 
+# app.web.webhook is imported by the bot in webhook mode only, so that the web
+# runner does not load aiogram
 __all__ = ["web_app"]
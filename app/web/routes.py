@@ -1,14 +1,15 @@
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import RedirectResponse
-from app.services.spotify import SpotifyService
+from fastapi.responses import RedirectResponse, Response
+from app.services.spotify import spotify_service
 from app.database.repository import UserRepository
 from app.database.connection import get_session
+from app.database.cache import invalidate_user
 from app.config import get_settings
 from app.logger import logger
+from app.metrics import CONTENT_TYPE_LATEST, render_metrics
 
 settings = get_settings()
 app = FastAPI()
-spotify_service = SpotifyService()
 
 
 @app.get("/health")
@@ -16,6 +17,11 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics")
+async def metrics():
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/login")
 async def spotify_login():
     logger.info("Initiating Spotify login process")
@@ -25,7 +31,7 @@ async def spotify_login():
 
 @app.get("/callback")
 async def spotify_callback(code: str, state: str):
-    logger.info(f"Received Spotify callback with state: {state}")
+    logger.info("Received Spotify callback with state: %s", state)
     try:
         refresh_token = await spotify_service.exchange_code_for_token(code)
         if not refresh_token:
@@ -35,10 +41,11 @@ async def spotify_callback(code: str, state: str):
         async for session in get_session():
             user_repo = UserRepository(session)
             await user_repo.save_refresh_token(telegram_id, refresh_token)
+        await invalidate_user(telegram_id)
 
         return RedirectResponse(
             url=f"https://t.me/{settings.TELEGRAM_BOT_USERNAME}?start=auth_success"
         )
     except Exception as e:
-        logger.error(f"Error in spotify_callback: {str(e)}")
+        logger.error("Error in spotify_callback: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
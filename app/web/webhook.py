@@ -0,0 +1,86 @@
+import asyncio
+import hmac
+import time
+from typing import Optional, Set
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+
+from app.logger import logger
+from app.metrics import TELEGRAM_WEBHOOK_SECONDS, TELEGRAM_WEBHOOK_UPDATES
+
+
+class TelegramWebhook:
+    """Receives Telegram updates on a FastAPI route and feeds them to aiogram"""
+
+    def __init__(self):
+        self.dp: Optional[Dispatcher] = None
+        self.bot: Optional[Bot] = None
+        self.secret: Optional[str] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def attach(
+        self, app: FastAPI, dp: Dispatcher, bot: Bot, path: str, secret: str
+    ) -> None:
+        """Mount the webhook route on the web app"""
+        self.dp = dp
+        self.bot = bot
+        self.secret = secret
+        app.add_api_route(
+            path, self.handle, methods=["POST"], include_in_schema=False
+        )
+
+    async def handle(
+        self,
+        request: Request,
+        x_telegram_bot_api_secret_token: Optional[str] = Header(None),
+    ) -> Response:
+        if not x_telegram_bot_api_secret_token or not hmac.compare_digest(
+            x_telegram_bot_api_secret_token.encode(), self.secret.encode()
+        ):
+            TELEGRAM_WEBHOOK_UPDATES.labels("rejected").inc()
+            logger.warning("Rejected webhook request with a wrong secret token")
+            raise HTTPException(status_code=401, detail="Invalid secret token")
+
+        try:
+            update = Update.model_validate(
+                await request.json(), context={"bot": self.bot}
+            )
+        except ValueError as e:
+            TELEGRAM_WEBHOOK_UPDATES.labels("invalid").inc()
+            logger.warning("Invalid webhook update: %s", e)
+            raise HTTPException(status_code=400, detail="Invalid update")
+
+        TELEGRAM_WEBHOOK_UPDATES.labels("accepted").inc()
+        # Acknowledge now so a slow handler never makes Telegram retry
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return Response(status_code=200)
+
+    async def _process(self, update: Update) -> None:
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            TELEGRAM_WEBHOOK_UPDATES.labels("failed").inc()
+            logger.error("Error processing update %s: %s", update.update_id, e)
+        finally:
+            TELEGRAM_WEBHOOK_SECONDS.observe(time.perf_counter() - started)
+
+    async def stop(self, timeout: float = 0.0) -> None:
+        """Give updates being processed up to timeout seconds, then cancel them"""
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+        if self._tasks:
+            logger.warning(
+                "Cancelling %s updates still processing at shutdown",
+                len(self._tasks),
+            )
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+telegram_webhook = TelegramWebhook()
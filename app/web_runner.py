@@ -2,12 +2,14 @@ import uvicorn
 from app.web import web_app
 from app.config import get_settings
 from app.database import init_db
+from app.services import spotify_service
 import asyncio
 
 settings = get_settings()
 
 async def main():
     await init_db()
+    await spotify_service.start()
     
     config = uvicorn.Config(
         web_app,
@@ -16,7 +18,10 @@ async def main():
         log_level=settings.UVICORN_LOG_LEVEL
     )
     server = uvicorn.Server(config)
-    await server.serve()
+    try:
+        await server.serve()
+    finally:
+        await spotify_service.close()
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    asyncio.run(main())
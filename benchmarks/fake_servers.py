@@ -0,0 +1,342 @@
+"""Local stand-ins for the Spotify and Telegram Bot APIs.
+
+    python -m benchmarks.fake_servers --spotify-latency 50 --spotify-429 0.01
+"""
+import argparse
+import asyncio
+import io
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from aiohttp import ClientSession, web
+
+HOST = "127.0.0.1"
+SPOTIFY_PORT = 8766
+TELEGRAM_PORT = 8767
+
+# Users are identified through their credentials: refresh token "rt-<id>",
+# access token "at-<id>" and channels "-100<id>", "-200<id>" and so on
+TITLE_PATTERN = re.compile(r"^Track (\d+) - ")
+
+
+@dataclass
+class FakeOptions:
+    host: str = HOST
+    spotify_port: int = SPOTIFY_PORT
+    telegram_port: int = TELEGRAM_PORT
+    track_seconds: float = 30.0
+    covers: int = 100
+    spotify_latency: float = 0.0  # seconds added to every Spotify response
+    telegram_latency: float = 0.0  # seconds added to every Telegram response
+    spotify_204: float = 0.0  # share of polls answered "nothing playing"
+    spotify_429: float = 0.0  # share of polls answered "rate limited"
+    telegram_429: float = 0.0  # share of Telegram writes answered "flood control"
+    seed: int = 0
+
+
+@dataclass
+class FakeStats:
+    token_requests: int = 0
+    playing_requests: int = 0
+    playing_204: int = 0
+    playing_429: int = 0
+    cover_requests: int = 0
+    telegram_requests: Dict[str, int] = field(default_factory=dict)
+    telegram_429: int = 0
+    # (track change time, seconds until the title reached Telegram)
+    title_latencies: List[Tuple[float, float]] = field(default_factory=list)
+    _seen_titles: Set[Tuple[int, int]] = field(default_factory=set)
+    webhook_url: Optional[str] = None
+    webhook_secret: Optional[str] = None
+    # (HTTP status, seconds until the webhook answered) per delivered update
+    webhook_deliveries: List[Tuple[int, float]] = field(default_factory=list)
+
+
+def user_offset(user_id: int, track_seconds: float) -> float:
+    """Stagger track changes so users do not all skip at the same instant"""
+    return (user_id * 7919) % 1000 / 1000 * track_seconds
+
+
+def track_period(user_id: int, now: float, track_seconds: float) -> int:
+    return int((now + user_offset(user_id, track_seconds)) // track_seconds)
+
+
+def track_started_at(user_id: int, period: int, track_seconds: float) -> float:
+    return period * track_seconds - user_offset(user_id, track_seconds)
+
+
+def make_cover(index: int) -> bytes:
+    """A 640px JPEG like Spotify serves; plain bytes when Pillow is missing"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return bytes([index % 256]) * 64 * 1024
+    color = ((index * 37) % 256, (index * 91) % 256, 128)
+    image = Image.new("RGB", (640, 640), color)
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=90)
+    return output.getvalue()
+
+
+def create_spotify_app(options: FakeOptions, stats: FakeStats) -> web.Application:
+    rng = random.Random(options.seed)
+    covers: Dict[int, bytes] = {}
+    base_url = f"http://{options.host}:{options.spotify_port}"
+
+    async def token(request: web.Request) -> web.Response:
+        stats.token_requests += 1
+        if options.spotify_latency:
+            await asyncio.sleep(options.spotify_latency)
+        form = await request.post()
+        user_id = str(form.get("refresh_token", "")).removeprefix("rt-")
+        return web.json_response(
+            {
+                "access_token": f"at-{user_id}",
+                "token_type": "Bearer",
+                "expires_in": 3600,
+            }
+        )
+
+    async def currently_playing(request: web.Request) -> web.Response:
+        stats.playing_requests += 1
+        if options.spotify_latency:
+            await asyncio.sleep(options.spotify_latency)
+        roll = rng.random()
+        if roll < options.spotify_429:
+            stats.playing_429 += 1
+            return web.json_response(
+                {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                status=429,
+                headers={"Retry-After": "1"},
+            )
+        if roll < options.spotify_429 + options.spotify_204:
+            stats.playing_204 += 1
+            return web.Response(status=204)
+
+        auth = request.headers.get("Authorization", "")
+        user_id = int(auth.removeprefix("Bearer at-"))
+        now = time.time()
+        period = track_period(user_id, now, options.track_seconds)
+        started = track_started_at(user_id, period, options.track_seconds)
+        cover = (user_id + period) % options.covers
+        return web.json_response(
+            {
+                "is_playing": True,
+                "progress_ms": int((now - started) * 1000),
+                "item": {
+                    "id": f"{user_id}-{period}",
+                    "name": f"Track {period}",
+                    "artists": [{"name": f"Artist {user_id}"}],
+                    "album": {
+                        "name": f"Album {cover}",
+                        "release_date": "2024-01-01",
+                        "images": [{"url": f"{base_url}/cover/{cover}.jpg"}],
+                    },
+                    "duration_ms": int(options.track_seconds * 1000),
+                    "external_urls": {
+                        "spotify": f"https://open.spotify.com/track/{user_id}-{period}"
+                    },
+                },
+            }
+        )
+
+    async def cover(request: web.Request) -> web.Response:
+        stats.cover_requests += 1
+        if options.spotify_latency:
+            await asyncio.sleep(options.spotify_latency)
+        index = int(request.match_info["index"])
+        if index not in covers:
+            covers[index] = make_cover(index)
+        return web.Response(body=covers[index], content_type="image/jpeg")
+
+    app = web.Application()
+    app.router.add_post("/api/token", token)
+    app.router.add_get("/v1/me/player/currently-playing", currently_playing)
+    app.router.add_get("/cover/{index}.jpg", cover)
+    return app
+
+
+def create_telegram_app(options: FakeOptions, stats: FakeStats) -> web.Application:
+    rng = random.Random(options.seed + 1)
+    message_ids = iter(range(1, 2**31))
+
+    async def method(request: web.Request) -> web.Response:
+        received = time.time()
+        name = request.match_info["method"]
+        stats.telegram_requests[name] = stats.telegram_requests.get(name, 0) + 1
+        if options.telegram_latency:
+            await asyncio.sleep(options.telegram_latency)
+        if rng.random() < options.telegram_429:
+            stats.telegram_429 += 1
+            return web.json_response(
+                {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests: retry after 1",
+                    "parameters": {"retry_after": 1},
+                }
+            )
+
+        form = await request.post()
+        chat_id = int(form.get("chat_id", 0))
+        if name == "setChatTitle":
+            record_title(chat_id, str(form.get("title", "")), received)
+        elif name == "setWebhook":
+            stats.webhook_url = str(form["url"])
+            stats.webhook_secret = form.get("secret_token")
+        elif name == "deleteWebhook":
+            stats.webhook_url = stats.webhook_secret = None
+
+        result: object = True
+        if name == "sendMessage":
+            result = {
+                "message_id": next(message_ids),
+                "date": int(received),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": str(form.get("text", "")),
+            }
+        elif name == "sendPhoto":
+            result = {
+                "message_id": next(message_ids),
+                "date": int(received),
+                "chat": {"id": chat_id, "type": "channel"},
+                "photo": [
+                    {
+                        "file_id": f"photo-{chat_id}-{received}",
+                        "file_unique_id": f"{chat_id}-{received}",
+                        "width": 512,
+                        "height": 512,
+                    }
+                ],
+            }
+        return web.json_response({"ok": True, "result": result})
+
+    def record_title(chat_id: int, title: str, received: float) -> None:
+        match = TITLE_PATTERN.match(title)
+        if not match:
+            return
+        user_id = int(str(abs(chat_id))[3:])
+        period = int(match.group(1))
+        # Only the first channel of a user to show the track is measured
+        if (user_id, period) in stats._seen_titles:
+            return
+        stats._seen_titles.add((user_id, period))
+        started = track_started_at(user_id, period, options.track_seconds)
+        stats.title_latencies.append((started, received - started))
+
+    async def deliver(request: web.Request) -> web.Response:
+        """Push the posted update to the registered webhook, like Telegram"""
+        # For a bot started with TELEGRAM_API_URL pointing here, e.g.
+        # curl -d '{"update_id": 1, "message": {...}}' http://127.0.0.1:8767/deliver
+        if stats.webhook_url is None:
+            return web.json_response({"error": "no webhook set"}, status=409)
+        headers = {"Content-Type": "application/json"}
+        if stats.webhook_secret:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = str(stats.webhook_secret)
+        started = time.perf_counter()
+        async with request.app["webhook_client"].post(
+            stats.webhook_url, data=await request.read(), headers=headers
+        ) as response:
+            status = response.status
+        elapsed = time.perf_counter() - started
+        stats.webhook_deliveries.append((status, elapsed))
+        return web.json_response({"status": status, "seconds": elapsed})
+
+    async def webhook_client(app: web.Application):
+        app["webhook_client"] = ClientSession()
+        yield
+        await app["webhook_client"].close()
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "token_requests": stats.token_requests,
+                "playing_requests": stats.playing_requests,
+                "playing_204": stats.playing_204,
+                "playing_429": stats.playing_429,
+                "cover_requests": stats.cover_requests,
+                "telegram_requests": stats.telegram_requests,
+                "telegram_429": stats.telegram_429,
+                "title_latencies": stats.title_latencies,
+                "webhook_url": stats.webhook_url,
+                "webhook_deliveries": stats.webhook_deliveries,
+            }
+        )
+
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app.cleanup_ctx.append(webhook_client)
+    app.router.add_post("/bot{token}/{method}", method)
+    app.router.add_post("/deliver", deliver)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+async def serve(options: FakeOptions) -> None:
+    """Serve both fake APIs until cancelled"""
+    stats = FakeStats()
+    runners = []
+    for app, port in (
+        (create_spotify_app(options, stats), options.spotify_port),
+        (create_telegram_app(options, stats), options.telegram_port),
+    ):
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, options.host, port).start()
+        runners.append(runner)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+def run(options: FakeOptions) -> None:
+    """Process entry point used by the load test"""
+    try:
+        asyncio.run(serve(options))
+    except KeyboardInterrupt:
+        pass
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--track-seconds", type=float, default=30.0)
+    parser.add_argument("--covers", type=int, default=100)
+    parser.add_argument(
+        "--spotify-latency", type=float, default=0.0, help="milliseconds"
+    )
+    parser.add_argument(
+        "--telegram-latency", type=float, default=0.0, help="milliseconds"
+    )
+    parser.add_argument("--spotify-204", type=float, default=0.0, help="share 0..1")
+    parser.add_argument("--spotify-429", type=float, default=0.0, help="share 0..1")
+    parser.add_argument("--telegram-429", type=float, default=0.0, help="share 0..1")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def options_from_args(args: argparse.Namespace) -> FakeOptions:
+    return FakeOptions(
+        track_seconds=args.track_seconds,
+        covers=args.covers,
+        spotify_latency=args.spotify_latency / 1000,
+        telegram_latency=args.telegram_latency / 1000,
+        spotify_204=args.spotify_204,
+        spotify_429=args.spotify_429,
+        telegram_429=args.telegram_429,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    add_arguments(parser)
+    options = options_from_args(parser.parse_args())
+    print(
+        f"Spotify on http://{options.host}:{options.spotify_port}, "
+        f"Telegram on http://{options.host}:{options.telegram_port}"
+    )
+    run(options)
@@ -0,0 +1,103 @@
+"""Compare per-request ClientSession against the shared SpotifyService session.
+
+    python -m benchmarks.http_session --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from aiohttp import ClientSession, web
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("TELEGRAM_BOT_USERNAME", "benchmark_bot")
+os.environ.setdefault("ADMIN_USER_ID", "0")
+os.environ.setdefault("SPOTIFY_CLIENT_ID", "benchmark")
+os.environ.setdefault("SPOTIFY_CLIENT_SECRET", "benchmark")
+os.environ.setdefault("SPOTIFY_REDIRECT_URI", "http://localhost/callback")
+os.environ["SPOTIFY_API_URL"] = f"http://{HOST}:{PORT}/v1"
+
+from app.services.spotify import SpotifyService  # noqa: E402
+
+TRACK = {
+    "is_playing": True,
+    "progress_ms": 1000,
+    "item": {
+        "id": "benchmark",
+        "name": "Benchmark",
+        "artists": [{"name": "Stub"}],
+        "album": {
+            "name": "Local",
+            "release_date": "2024-01-01",
+            "images": [{"url": f"http://{HOST}:{PORT}/cover.jpg"}],
+        },
+        "duration_ms": 180000,
+        "external_urls": {"spotify": "https://open.spotify.com/track/0"},
+    }
+}
+
+
+async def currently_playing(request: web.Request) -> web.Response:
+    return web.json_response(TRACK)
+
+
+async def start_stub_server() -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/v1/me/player/currently-playing", currently_playing)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, HOST, PORT).start()
+    return runner
+
+
+async def per_request_session(url: str) -> None:
+    async with ClientSession() as session:
+        async with session.get(url, headers={"Authorization": "Bearer x"}) as response:
+            await response.json()
+
+
+async def run(label: str, call, requests: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await call()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    print(f"{label:<24} {requests / elapsed:10.1f} req/s  ({elapsed:.2f}s)")
+
+
+async def main(requests: int, concurrency: int) -> None:
+    runner = await start_stub_server()
+    url = f"http://{HOST}:{PORT}/v1/me/player/currently-playing"
+    service = SpotifyService()
+    try:
+        await run(
+            "per-request session",
+            lambda: per_request_session(url),
+            requests,
+            concurrency,
+        )
+        await service.start()
+        await run(
+            "shared session",
+            lambda: service.get_current_track("x"),
+            requests,
+            concurrency,
+        )
+    finally:
+        await service.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
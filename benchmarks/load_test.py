@@ -0,0 +1,299 @@
+"""Drive the polling pipeline with simulated users against fake APIs.
+
+    python -m benchmarks.load_test --users 1000 --duration 120
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from aiohttp import ClientSession
+
+from benchmarks.fake_servers import (
+    HOST,
+    SPOTIFY_PORT,
+    TELEGRAM_PORT,
+    add_arguments,
+    options_from_args,
+    run as run_fake_servers,
+)
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("TELEGRAM_BOT_USERNAME", "benchmark_bot")
+os.environ.setdefault("ADMIN_USER_ID", "0")
+os.environ.setdefault("SPOTIFY_CLIENT_ID", "benchmark")
+os.environ.setdefault("SPOTIFY_CLIENT_SECRET", "benchmark")
+os.environ.setdefault("SPOTIFY_REDIRECT_URI", "http://localhost/callback")
+# Measure the process rather than the limiter unless a rate is given
+os.environ.setdefault("TELEGRAM_GLOBAL_RATE", "1000000")
+os.environ.setdefault("TELEGRAM_GLOBAL_BURST", "1000000")
+os.environ["SPOTIFY_TOKEN_URL"] = f"http://{HOST}:{SPOTIFY_PORT}/api/token"
+os.environ["SPOTIFY_API_URL"] = f"http://{HOST}:{SPOTIFY_PORT}/v1"
+# Never touch a real database: an empty POSTGRES_DB falls back to SQLite
+os.environ["POSTGRES_DB"] = ""
+os.environ["SQLITE_PATH"] = os.path.join(
+    tempfile.mkdtemp(prefix="spoticast-bench-"), "spoticast.db"
+)
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+
+from app.bot import handlers  # noqa: E402
+from app.bot.handlers import (  # noqa: E402
+    playback_states,
+    poll_scheduler,
+    update_channel_with_spotify_info,
+)
+from app.bot.outbox import telegram_outbox  # noqa: E402
+from app.database import init_db, get_session, UserRepository  # noqa: E402
+from app.database.cache import user_config_cache  # noqa: E402
+from app.database.models import UserChannel  # noqa: E402
+from app.services.image_processing import image_processor  # noqa: E402
+from app.services.spotify import spotify_service  # noqa: E402
+
+STATS_URL = f"http://{HOST}:{TELEGRAM_PORT}/stats"
+
+
+async def wait_for_fake_servers(timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with ClientSession() as session:
+        while True:
+            try:
+                async with session.get(STATS_URL) as response:
+                    if response.status == 200:
+                        return
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+            await asyncio.sleep(0.1)
+
+
+async def fetch_fake_stats() -> Dict[str, Any]:
+    async with ClientSession() as session:
+        async with session.get(STATS_URL) as response:
+            return await response.json()
+
+
+def channel_ids(user_id: int, channels_per_user: int) -> List[str]:
+    return [f"-{index}00{user_id}" for index in range(1, channels_per_user + 1)]
+
+
+async def seed_users(count: int, channels_per_user: int) -> List[int]:
+    user_ids = list(range(1, count + 1))
+    async for session in get_session():
+        user_repo = UserRepository(session)
+        await user_repo.bulk_save_refresh_tokens(
+            {user_id: f"rt-{user_id}" for user_id in user_ids}
+        )
+        await user_repo.bulk_update(
+            {
+                user_id: {
+                    "channel_id": channel_ids(user_id, 1)[0],
+                    "updates_enabled": True,
+                }
+                for user_id in user_ids
+            }
+        )
+        session.add_all(
+            UserChannel(telegram_id=user_id, channel_id=channel_id)
+            for user_id in user_ids
+            for channel_id in channel_ids(user_id, channels_per_user)
+        )
+        await session.commit()
+    return user_ids
+
+
+def percentile(values: List[float], q: int) -> Optional[float]:
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_load(
+    users: int,
+    channels_per_user: int,
+    duration: float,
+    warmup: float,
+    settle: float,
+) -> Dict[str, Any]:
+    await wait_for_fake_servers()
+    await init_db()
+    user_ids = await seed_users(users, channels_per_user)
+    await user_config_cache.warm()
+    await spotify_service.start()
+    bot = Bot(
+        token=os.environ["TELEGRAM_BOT_TOKEN"],
+        session=AiohttpSession(
+            api=TelegramAPIServer.from_base(f"http://{HOST}:{TELEGRAM_PORT}")
+        ),
+    )
+    handlers.telegram_bot = bot
+    await telegram_outbox.start()
+    await poll_scheduler.start(update_channel_with_spotify_info)
+
+    try:
+        for user_id in user_ids:
+            poll_scheduler.add(user_id)
+
+        # Initial polls post every user's current track at once; measure after
+        await asyncio.sleep(warmup)
+        before = await fetch_fake_stats()
+        polls_before = poll_scheduler.metrics().polls_total
+        usage_before = resource.getrusage(resource.RUSAGE_SELF)
+        started_at = time.time()
+        started = time.monotonic()
+
+        await asyncio.sleep(duration)
+
+        elapsed = time.monotonic() - started
+        usage_after = resource.getrusage(resource.RUSAGE_SELF)
+        polls = poll_scheduler.metrics().polls_total - polls_before
+        after = await fetch_fake_stats()
+        scheduler_metrics = poll_scheduler.metrics()
+        outbox_metrics = telegram_outbox.metrics()
+
+        # Let titles for changes late in the window arrive before reading them
+        await asyncio.sleep(settle)
+        title_latencies = (await fetch_fake_stats())["title_latencies"]
+    finally:
+        await poll_scheduler.stop()
+        await telegram_outbox.stop()
+        await spotify_service.close()
+        await bot.session.close()
+        image_processor.shutdown()
+
+    cpu_seconds = (usage_after.ru_utime + usage_after.ru_stime) - (
+        usage_before.ru_utime + usage_before.ru_stime
+    )
+    # Only count track changes whose title was due inside the window
+    latencies = [
+        latency
+        for changed_at, latency in title_latencies
+        if started_at <= changed_at < started_at + duration
+    ]
+    telegram_requests = sum(after["telegram_requests"].values()) - sum(
+        before["telegram_requests"].values()
+    )
+    return {
+        "polls": polls,
+        "polls_per_second": polls / elapsed,
+        "spotify_requests": after["playing_requests"] - before["playing_requests"],
+        "telegram_requests": telegram_requests,
+        "title_updates": len(latencies),
+        "title_latency_p50": percentile(latencies, 50),
+        "title_latency_p99": percentile(latencies, 99),
+        "title_latency_max": max(latencies, default=None),
+        "max_poll_lag": scheduler_metrics.max_lag,
+        "outbox_pending": outbox_metrics.pending,
+        "playback_states": len(playback_states),
+        "cpu_seconds": cpu_seconds,
+        "cpu_percent": 100 * cpu_seconds / elapsed,
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        "max_rss_mb": usage_after.ru_maxrss
+        / (1024 * 1024 if platform.system() == "Darwin" else 1024),
+    }
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    def seconds(value: Optional[float]) -> str:
+        return "n/a" if value is None else f"{value * 1000:.0f} ms"
+
+    print(
+        f"polls                {results['polls']} "
+        f"({results['polls_per_second']:.1f}/s)"
+    )
+    print(f"spotify requests     {results['spotify_requests']}")
+    print(f"telegram requests    {results['telegram_requests']}")
+    print(f"title updates        {results['title_updates']}")
+    print(f"title latency p50    {seconds(results['title_latency_p50'])}")
+    print(f"title latency p99    {seconds(results['title_latency_p99'])}")
+    print(f"title latency max    {seconds(results['title_latency_max'])}")
+    print(f"max poll lag         {seconds(results['max_poll_lag'])}")
+    print(
+        f"cpu                  {results['cpu_seconds']:.2f}s "
+        f"({results['cpu_percent']:.1f}%)"
+    )
+    print(f"peak rss             {results['max_rss_mb']:.1f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument(
+        "--channels-per-user", type=int, default=1, choices=range(1, 10)
+    )
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds")
+    parser.add_argument(
+        "--warmup", type=float, default=15.0, help="seconds before measuring"
+    )
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=10.0,
+        help="seconds to wait for late title updates after measuring",
+    )
+    parser.add_argument("--output", help="write parameters and results as JSON")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    fake_servers = multiprocessing.get_context("spawn").Process(
+        target=run_fake_servers, args=(options_from_args(args),), daemon=True
+    )
+    fake_servers.start()
+    try:
+        results = asyncio.run(
+            run_load(
+                args.users,
+                args.channels_per_user,
+                args.duration,
+                args.warmup,
+                args.settle,
+            )
+        )
+    finally:
+        fake_servers.terminate()
+        fake_servers.join()
+
+    print_report(results)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "commit": current_commit(),
+                    "python": platform.python_version(),
+                    "parameters": vars(args),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Measure caption rendering per track change, fresh and memoized.
+
+    python -m benchmarks.rendering --iterations 50000
+"""
+import argparse
+import os
+import timeit
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("TELEGRAM_BOT_USERNAME", "benchmark_bot")
+os.environ.setdefault("ADMIN_USER_ID", "0")
+os.environ.setdefault("SPOTIFY_CLIENT_ID", "benchmark")
+os.environ.setdefault("SPOTIFY_CLIENT_SECRET", "benchmark")
+os.environ.setdefault("SPOTIFY_REDIRECT_URI", "http://localhost/callback")
+
+from app.bot.messages import MESSAGES  # noqa: E402
+from app.bot.rendering import (  # noqa: E402
+    CAPTION_TEMPLATE,
+    TrackRenderer,
+    render_track,
+)
+from app.services.track import Track  # noqa: E402
+
+TRACK = Track(
+    track_id="track0",
+    title="Don't Stop Me Now - Remastered 2011",
+    artists="Queen",
+    album="Jazz (2011 Remaster)",
+    release_date="1978-11-10",
+    duration_ms=209413,
+    progress_ms=42000,
+    is_playing=True,
+    album_cover_url="https://i.scdn.co/image/640",
+    track_url="https://open.spotify.com/track/7hQJA50XrCWABAu5v6QZ4i",
+)
+
+LEGACY_TEMPLATE = (
+    "🎵 {title}\n"
+    "👤 {artists}\n"
+    "💿 {album}\n"
+    "📅 {release_date}\n"
+    "⏱ {duration}\n"
+    "🔗 [Spotify]({track_url})\n"
+    "🎧 [Яндекс Музыка](https://music.yandex.ru/search?text={search_text})\n"
+    "🎵 [VK Музыка](https://vk.com/audio?q={search_text})\n"
+    "▶️ [YouTube](https://www.youtube.com/results?search_query={search_text})\n\n"
+)
+
+
+def legacy_render(track: Track) -> tuple:
+    """Inline rendering as the polling loop used to do it, without escaping"""
+    channel_title = f"{track.title} - {track.artists}"
+    duration_min, duration_sec = divmod(track.duration_ms // 1000, 60)
+    search_text = (
+        f"{track.title} {track.artists}".replace(" ", "+")
+        .replace("&", "%26")
+        .replace("?", "%3F")
+    )
+    caption = LEGACY_TEMPLATE.format(
+        title=track.title,
+        artists=track.artists,
+        album=track.album,
+        release_date=track.release_date,
+        duration=f"{duration_min}:{duration_sec:02d}",
+        track_url=track.track_url,
+        search_text=search_text,
+    )
+    return channel_title, caption
+
+
+def main(iterations: int) -> None:
+    values = {
+        "title": "title",
+        "artists": "artists",
+        "album": "album",
+        "release_date": "2024-01-01",
+        "duration": "3:29",
+        "track_url": "https://open.spotify.com/track/x",
+        "search_text": "title+artists",
+    }
+    renderer = TrackRenderer()
+    renderer.render(TRACK)
+
+    candidates = [
+        (
+            "str.format template",
+            lambda: MESSAGES["track_info_template"].format(**values),
+        ),
+        ("compiled template", lambda: CAPTION_TEMPLATE.render(values)),
+        ("legacy inline render", lambda: legacy_render(TRACK)),
+        ("render_track", lambda: render_track(TRACK)),
+        ("memoized render", lambda: renderer.render(TRACK)),
+    ]
+    for label, call in candidates:
+        best = min(timeit.repeat(call, number=iterations, repeat=5))
+        print(f"{label:<24} {best / iterations * 1e6:8.2f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=50000)
+    args = parser.parse_args()
+    main(args.iterations)
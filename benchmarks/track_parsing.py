@@ -0,0 +1,134 @@
+"""Measure the cost of decoding one currently-playing response.
+
+    python -m benchmarks.track_parsing --iterations 20000
+"""
+import argparse
+import json
+import os
+import string
+import timeit
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("TELEGRAM_BOT_USERNAME", "benchmark_bot")
+os.environ.setdefault("ADMIN_USER_ID", "0")
+os.environ.setdefault("SPOTIFY_CLIENT_ID", "benchmark")
+os.environ.setdefault("SPOTIFY_CLIENT_SECRET", "benchmark")
+os.environ.setdefault("SPOTIFY_REDIRECT_URI", "http://localhost/callback")
+
+from app.services.track import Track, orjson  # noqa: E402
+
+# Roughly the number of markets Spotify lists for a widely available track
+MARKETS = [a + b for a in string.ascii_uppercase for b in string.ascii_uppercase]
+MARKETS = MARKETS[:185]
+
+
+def artist(index: int) -> dict:
+    return {
+        "external_urls": {"spotify": f"https://open.spotify.com/artist/{index}"},
+        "href": f"https://api.spotify.com/v1/artists/{index}",
+        "id": f"artist{index}",
+        "name": f"Artist {index}",
+        "type": "artist",
+        "uri": f"spotify:artist:artist{index}",
+    }
+
+
+PAYLOAD = json.dumps(
+    {
+        "timestamp": 1700000000000,
+        "context": {
+            "external_urls": {"spotify": "https://open.spotify.com/playlist/x"},
+            "href": "https://api.spotify.com/v1/playlists/x",
+            "type": "playlist",
+            "uri": "spotify:playlist:x",
+        },
+        "progress_ms": 42000,
+        "item": {
+            "album": {
+                "album_type": "album",
+                "artists": [artist(1), artist(2)],
+                "available_markets": MARKETS,
+                "external_urls": {"spotify": "https://open.spotify.com/album/a"},
+                "href": "https://api.spotify.com/v1/albums/a",
+                "id": "album0",
+                "images": [
+                    {
+                        "height": size,
+                        "url": f"https://i.scdn.co/image/{size}",
+                        "width": size,
+                    }
+                    for size in (640, 300, 64)
+                ],
+                "name": "Benchmark Album",
+                "release_date": "2024-01-01",
+                "release_date_precision": "day",
+                "total_tracks": 12,
+                "type": "album",
+                "uri": "spotify:album:album0",
+            },
+            "artists": [artist(1), artist(2)],
+            "available_markets": MARKETS,
+            "disc_number": 1,
+            "duration_ms": 215000,
+            "explicit": False,
+            "external_ids": {"isrc": "XX0000000000"},
+            "external_urls": {"spotify": "https://open.spotify.com/track/t"},
+            "href": "https://api.spotify.com/v1/tracks/t",
+            "id": "track0",
+            "is_local": False,
+            "name": "Benchmark Track",
+            "popularity": 50,
+            "preview_url": None,
+            "track_number": 3,
+            "type": "track",
+            "uri": "spotify:track:track0",
+        },
+        "currently_playing_type": "track",
+        "actions": {"disallows": {"resuming": True}},
+        "is_playing": True,
+    }
+).encode()
+
+
+def dict_extraction(raw: bytes) -> dict:
+    """How get_current_track used to turn the response into a dict"""
+    track_data = json.loads(raw)
+    return {
+        "track_id": track_data["item"]["id"],
+        "title": track_data["item"]["name"],
+        "artists": ", ".join(
+            [artist["name"] for artist in track_data["item"]["artists"]]
+        ),
+        "album": track_data["item"]["album"]["name"],
+        "release_date": track_data["item"]["album"]["release_date"],
+        "duration_ms": track_data["item"]["duration_ms"],
+        "progress_ms": track_data.get("progress_ms") or 0,
+        "is_playing": track_data.get("is_playing", False),
+        "album_cover_url": track_data["item"]["album"]["images"][0]["url"],
+        "track_url": track_data["item"]["external_urls"]["spotify"],
+    }
+
+
+def main(iterations: int) -> None:
+    candidates = [
+        ("json + dict extraction", lambda: dict_extraction(PAYLOAD)),
+        ("json + Track", lambda: Track.from_dict(json.loads(PAYLOAD))),
+    ]
+    if orjson is not None:
+        candidates.append(
+            ("orjson + Track", lambda: Track.from_dict(orjson.loads(PAYLOAD)))
+        )
+    else:
+        print("orjson is not installed; skipping it")
+
+    print(f"payload: {len(PAYLOAD)} bytes")
+    for label, call in candidates:
+        best = min(timeit.repeat(call, number=iterations, repeat=5))
+        print(f"{label:<24} {best / iterations * 1e6:8.2f} us/poll")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    main(args.iterations)
@@ -0,0 +1,9 @@
+import os
+
+# Settings are read on import, so they must be set before the app is imported
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "0:test")
+os.environ.setdefault("TELEGRAM_BOT_USERNAME", "test_bot")
+os.environ.setdefault("ADMIN_USER_ID", "0")
+os.environ.setdefault("SPOTIFY_CLIENT_ID", "test")
+os.environ.setdefault("SPOTIFY_CLIENT_SECRET", "test")
+os.environ.setdefault("SPOTIFY_REDIRECT_URI", "http://localhost/callback")
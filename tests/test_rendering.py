@@ -0,0 +1,99 @@
+import html
+import re
+
+from app.bot.rendering import (
+    MAX_CAPTION_LENGTH,
+    MAX_CHANNEL_TITLE_LENGTH,
+    TrackRenderer,
+    render_track,
+    telegram_length,
+)
+from app.services.track import Track
+
+TAG = re.compile(r"<[^>]+>")
+
+
+def make_track(**fields) -> Track:
+    values = {
+        "track_id": "t1",
+        "title": "Song",
+        "artists": "Artist",
+        "album": "Album",
+        "release_date": "2024-01-01",
+        "duration_ms": 209000,
+        "progress_ms": 0,
+        "is_playing": True,
+        "album_cover_url": None,
+        "track_url": "https://open.spotify.com/track/t1",
+    }
+    values.update(fields)
+    return Track(**values)
+
+
+def visible_text(caption: str) -> str:
+    """The caption as Telegram displays it"""
+    return html.unescape(TAG.sub("", caption))
+
+
+def test_escapes_html_and_keeps_markdown_characters():
+    title = 'snake_case *bold* <b>x</b> & "quoted"'
+    rendered = render_track(make_track(title=title, artists="A&B"))
+
+    assert "<b>x</b>" not in rendered.caption
+    assert "&lt;b&gt;x&lt;/b&gt; &amp;" in rendered.caption
+    assert f"🎵 {title}\n" in visible_text(rendered.caption)
+    assert "👤 A&B\n" in visible_text(rendered.caption)
+    assert "⏱ 3:29\n" in rendered.caption
+    # The channel title is plain text and is not escaped
+    assert rendered.channel_title == f"{title} - A&B"
+
+
+def test_escapes_link_targets():
+    rendered = render_track(
+        make_track(title='a"b', track_url='https://example.com/?a=1&b="2"')
+    )
+    assert 'href="https://example.com/?a=1&amp;b=&quot;2&quot;"' in rendered.caption
+    assert "text=a%22b+Artist" in rendered.caption
+
+
+def test_caption_truncated_to_limit():
+    rendered = render_track(
+        make_track(title="🎶" * 2000, artists="x" * 300, album="y" * 50)
+    )
+    visible = visible_text(rendered.caption)
+    assert telegram_length(visible) <= MAX_CAPTION_LENGTH
+    # The longest field is shortened first; short fields survive
+    assert "…\n" in visible
+    assert "💿 " + "y" * 50 + "\n" in visible
+    # Link targets are not truncated
+    assert 'href="https://open.spotify.com/track/t1"' in rendered.caption
+
+
+def test_short_caption_not_truncated():
+    visible = visible_text(render_track(make_track()).caption)
+    assert "…" not in visible
+    assert telegram_length(visible) < MAX_CAPTION_LENGTH
+
+
+def test_channel_title_truncated_to_limit():
+    rendered = render_track(make_track(title="😀" * 100, artists="Artist"))
+    assert telegram_length(rendered.channel_title) <= MAX_CHANNEL_TITLE_LENGTH
+    assert rendered.channel_title.endswith("…")
+
+
+def test_render_hash_is_stable_and_content_based():
+    first = render_track(make_track())
+    assert render_track(make_track(track_id="relinked")).render_hash == (
+        first.render_hash
+    )
+    assert render_track(make_track(title="Other")).render_hash != first.render_hash
+
+
+def test_renderer_memoizes_and_evicts():
+    renderer = TrackRenderer(max_entries=2)
+    first = renderer.render(make_track(track_id="a"))
+    assert renderer.render(make_track(track_id="a")) is first
+    renderer.render(make_track(track_id="b"))
+    renderer.render(make_track(track_id="c"))
+    assert len(renderer) == 2
+    assert (renderer.hits, renderer.misses) == (1, 3)
@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+from app.services import track as track_module
+from app.services.track import SPOTIFY_WEB_URL, Track
+
+PLAYING = {
+    "progress_ms": 1000,
+    "is_playing": True,
+    "item": {
+        "type": "track",
+        "id": "t1",
+        "name": "Song",
+        "artists": [{"name": "A"}, {"name": "B"}],
+        "album": {
+            "name": "Album",
+            "release_date": "2024-01-01",
+            "images": [{"url": "large"}, {"url": "small"}],
+        },
+        "duration_ms": 180000,
+        "external_urls": {"spotify": "https://open.spotify.com/track/t1"},
+    },
+}
+
+EXPECTED = Track(
+    track_id="t1",
+    title="Song",
+    artists="A, B",
+    album="Album",
+    release_date="2024-01-01",
+    duration_ms=180000,
+    progress_ms=1000,
+    is_playing=True,
+    album_cover_url="large",
+    track_url="https://open.spotify.com/track/t1",
+)
+
+
+def test_track():
+    assert Track.from_dict(PLAYING) == EXPECTED
+
+
+@pytest.mark.parametrize("decoder", ["orjson", "json"])
+def test_from_json(monkeypatch, decoder):
+    if decoder == "orjson":
+        orjson = pytest.importorskip("orjson")
+        monkeypatch.setattr(track_module, "loads", orjson.loads)
+    else:
+        monkeypatch.setattr(track_module, "loads", json.loads)
+    assert Track.from_json(json.dumps(PLAYING).encode()) == EXPECTED
+
+
+def test_episode_uses_show():
+    track = Track.from_dict(
+        {
+            "is_playing": True,
+            "item": {
+                "type": "episode",
+                "id": "e1",
+                "name": "Episode",
+                "release_date": "2024-02-02",
+                "duration_ms": 3600000,
+                "images": [],
+                "show": {
+                    "name": "Show",
+                    "publisher": "Publisher",
+                    "images": [{"url": "show-cover"}],
+                },
+                "external_urls": {"spotify": "https://open.spotify.com/episode/e1"},
+            },
+        }
+    )
+    assert track.is_episode
+    assert track.artists == "Publisher"
+    assert track.album == "Show"
+    assert track.release_date == "2024-02-02"
+    assert track.album_cover_url == "show-cover"
+    assert track.progress_ms == 0
+
+
+def test_missing_images_and_local_file():
+    track = Track.from_dict(
+        {
+            "is_playing": False,
+            "item": {
+                "type": "track",
+                "id": None,
+                "uri": "spotify:local:A:Album:Song:180",
+                "name": "Song",
+                "artists": [{"name": "A"}],
+                "album": {"name": "Album", "images": []},
+                "duration_ms": 180000,
+                "external_urls": {},
+            },
+        }
+    )
+    assert track.track_id == "spotify:local:A:Album:Song:180"
+    assert track.album_cover_url is None
+    assert track.track_url == SPOTIFY_WEB_URL
+    assert track.release_date == ""
+    assert not track.is_playing
+
+
+def test_null_item():
+    assert Track.from_dict({"is_playing": True, "item": None}) is None
+    assert Track.from_json(json.dumps({"currently_playing_type": "ad"})) is None